@@ -1,5 +1,8 @@
-import sys, time
+import time
+import asyncio
 import json, textwrap
+import hashlib
+import functools
 
 import logging
 from typing import Any
@@ -10,13 +13,17 @@ from a2a.types import Message, TaskState, Part, TextPart, DataPart
 from a2a.utils import get_message_text, new_agent_text_message
 
 from messenger import Messenger
-
-
-
-cryptic_repo="./src/cryptic-crossword-reasoning-verifier"
-sys.path.append(cryptic_repo)
-from solver import corpora as cryptic_corpora
-from solver import dataset as cryptic_dataset
+from transcripts import TRANSCRIPT_MODES, RecordingMessenger, ReplayMessenger
+from status_updates import (
+    StatusCoalescer, conversation_logger, STATUS_MODES, DEFAULT_STATUS_MODE, DEFAULT_STATUS_WINDOW, DEFAULT_STATUS_MAX_CHARS,
+)
+from dictionary_search import DictionarySearch
+from phrase_index import (
+    PhraseEmbedder, build_phrase_index, load_phrase_index, load_worker_index, search_parity, canonical_pattern,
+    SELF_CHECK_QUERIES, SELF_CHECK_MIN_OVERLAP,
+)
+import clue_dataset
+from metrics import TASK_PHASE_SECONDS, TASK_SECONDS, TASK_TURNS, TASK_TOOL_CALLS
 
 
 logging.basicConfig(level=logging.INFO)
@@ -36,11 +43,21 @@ class CrypticScore(BaseModel):
 
 ANSWER_ACTION_NAME = "answer"
 SEARCH_ACTION_NAME = "dictionary_search"
+ANAGRAM_ACTION_NAME = "anagram_search"
+TOOL_ACTION_NAMES = [SEARCH_ACTION_NAME, ANAGRAM_ACTION_NAME]
+TOOL_ARGUMENTS = {  # tool -> (required string arguments, optional arguments)
+    SEARCH_ACTION_NAME: (["definition"], ["pattern", "substrings"]),
+    ANAGRAM_ACTION_NAME: (["letters"], ["pattern", "definition"]),
+}
+CONTEXT_POLICIES = ["shared", "fresh", "rolling"]  # One conversation for all the clues, one per clue, or one per context_window clues
+DEFAULT_CONTEXT_WINDOW = 10
+MAX_SEARCHES_PER_TURN = 8  # Tool calls run (concurrently) for a single solver response
+MAX_ANAGRAMS = 10  # anagram_search results returned
 
 task_evaluation_preamble=f"""
 Cryptic Crossword clue answering
 
-You may use both reasoning and the following dictionary tool to answer the given clues:
+You may use both reasoning and the following dictionary tools to answer the given clues:
 
 {json.dumps({
     "type": "function",
@@ -55,7 +72,8 @@ You may use both reasoning and the following dictionary tool to answer the given
                     "type": "string"
                 },
                 "pattern": {
-                    "description": "The format required for each response in standard notation - e.g. (8) for eight-letter responses.",
+                    "description": "The format required for each response in standard notation - e.g. (8) for eight-letter responses. "
+                                   "Known letters can be given in place - e.g. ?L?D?E???? (or ??? ?L??, for two words) with ? for each unknown letter.",
                     "title": "Pattern",
                     "type": "string"
                 },
@@ -72,6 +90,37 @@ You may use both reasoning and the following dictionary tool to answer the given
     }
 }, indent=2)}
 
+{json.dumps({
+    "type": "function",
+    "function": {
+        "name": ANAGRAM_ACTION_NAME,
+        "description": f"Look up dictionary words and phrases that use exactly the given letters (up to {MAX_ANAGRAMS}).",
+        "parameters": {
+            "properties": {
+                "letters": {
+                    "description": "The letters to be rearranged (spaces and punctuation are ignored).",
+                    "title": "Letters",
+                    "type": "string"
+                },
+                "pattern": {
+                    "description": "The format required for each response in standard notation - e.g. (4,4) for two four-letter words. "
+                                   "Known letters can be given in place - e.g. ?I???? (or ?L?? ????, for two words) with ? for each unknown letter.",
+                    "title": "Pattern",
+                    "type": "string"
+                },
+                "definition": {
+                    "description": "If given, the responses are ordered by how close they are to it.",
+                    "title": "Definition",
+                    "type": "string"
+                }
+            },
+            "required": ["letters"],
+            "title": "parameters",
+            "type": "object"
+        }
+    }
+}, indent=2)}
+
 The final answer should be returned using the following tool call:
 
 {json.dumps({
@@ -100,7 +149,8 @@ The JSON should contain:
 - "name": the tool call function name.
 - "arguments": the arguments for the tool call.
 
-You should only use one tool at a time!
+You may make several dictionary_search and anagram_search calls at once, as a JSON list of tool calls (up to {MAX_SEARCHES_PER_TURN}) : 
+their results are returned together, as a list in the same order.
 You cannot respond to user and use a tool at the same time!
 
 Examples of responses (for the clue "Initially, babies are naked (4)")
@@ -110,6 +160,14 @@ Examples of responses (for the clue "Initially, babies are naked (4)")
 
 the tool call response is a list of the 20 closest words obeying the constraints given.
 
+<json>
+{json.dumps([
+    {"name": "dictionary_search", "arguments": {"definition": "naked", "pattern": "(4)"}},
+    {"name": "dictionary_search", "arguments": {"definition": "babies", "pattern": "(4)"}},
+    {"name": "anagram_search", "arguments": {"letters": "bear", "definition": "naked"}},
+], indent=2)}
+</json>
+
 <json>
 {json.dumps({"name": ANSWER_ACTION_NAME, "arguments": {"answer": "BARE"}}, indent=2)}
 </json>
@@ -119,80 +177,112 @@ the tool call response is a list of the 20 closest words obeying the constraints
 
 
 
-# Do these loads globally, since they are static (don't depend on Agent launches)
-print("Loading Cryptic Crossword data")
+# The dictionary tool is static (doesn't depend on Agent launches), but slow to load :
+#   load_dictionary_tool() runs in the background (started by server.py), so that the server
+#   can bind its port immediately.  Evaluations wait until dictionary_ready is set
+vector_embedder = None
+crossword_dictionary = None
+dictionary_search = None
+dictionary_ready = asyncio.Event()
+dictionary_load_error = None
+
+DICTIONARY_READY_TIMEOUT = 600  # seconds an evaluation waits for the dictionary tool before being rejected
+MODEL_FILE = "./src/cc.en.100.bin"
+PHRASE_INDEX_DIR = "./src/ukacd-index"
+
+
+def load_crossword_dictionary(model_file=MODEL_FILE, phrase_index_dir=PHRASE_INDEX_DIR):
+    print("Loading Cryptic Crossword data")
+
+    t0=time.time()
+    vector_embedder = PhraseEmbedder(model_file=model_file)
+    print(f"Loaded Vector Embedding model in {(time.time()-t0):.2f}sec")
+
+    # The dictionary's phrase embeddings are pre-computed by setup-build-index.py, and just memory-mapped here
+    t0=time.time()
+    try:
+        crossword_dictionary = load_phrase_index(phrase_index_dir, vector_embedder)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"{e} : Building it now (this is slow)")
+        build_phrase_index(vector_embedder, './src/UKACD.txt', phrase_index_dir, strip_header=False)
+        crossword_dictionary = load_phrase_index(phrase_index_dir, vector_embedder)
+    print(f"Loaded Dictionary in {(time.time()-t0):.2f}sec")
+    return vector_embedder, crossword_dictionary
+
+
+async def load_dictionary_tool(index_config=None, search_config=None, self_check=False, min_parity=SELF_CHECK_MIN_OVERLAP):
+    """Load the embedder and dictionary (in a thread), then start the dictionary_search workers
+
+    index_config and search_config are passed to crossword_dictionary.configure() and
+    DictionarySearch() respectively.  The self-check queries are always run : the tool only 
+    becomes ready if their results match CrosswordDictionary's (to within min_parity).
+    If self_check, their results (and timing) are also printed.
+    """
+    global vector_embedder, crossword_dictionary, dictionary_search, dictionary_load_error
+    try:
+        vector_embedder, crossword_dictionary = await asyncio.to_thread(load_crossword_dictionary)
+        crossword_dictionary.configure(**(index_config or {}))
+
+        # Searches run in a worker pool, so they don't block the event loop
+        #   (process workers each load the index, which is built by now, memory-mapping the same files)
+        dictionary_search = DictionarySearch(
+            crossword_dictionary, **(search_config or {}),
+            worker_loader=functools.partial(load_worker_index, PHRASE_INDEX_DIR, index_config))
+
+        t0=time.time()
+        await asyncio.to_thread(dictionary_self_check, crossword_dictionary, min_parity, verbose=self_check)
+        if self_check:
+            print(f"Dictionary self-check took {(time.time()-t0):.2f}sec")
+
+        dictionary_ready.set()
+    except Exception as e:
+        dictionary_load_error = e
+        logger.exception(f"Failed to load the dictionary tool : {e}")
+
+
+async def wait_for_dictionary(timeout=DICTIONARY_READY_TIMEOUT):
+    """True once the dictionary tool is ready (False if it failed to load, or timeout seconds pass)"""
+    t_end = time.monotonic()+timeout
+    while dictionary_status()=="loading" and time.monotonic()<t_end:
+        try:
+            await asyncio.wait_for(dictionary_ready.wait(), timeout=min(1.0, max(t_end-time.monotonic(), 0.)))
+        except asyncio.TimeoutError:
+            pass
+    return dictionary_ready.is_set()
 
-t0=time.time()
-vector_embedder = cryptic_corpora.VectorEmbedder(model_file="./src/cc.en.100.bin")
-print(f"Loaded Vector Embedding model in {(time.time()-t0):.2f}sec")
 
-t0=time.time()
-crossword_dictionary = cryptic_corpora.CrosswordDictionary(
-    vector_embedder, crossword_dictionary_file='./src/UKACD.txt', strip_header=False)
-print(f"Loaded Dictionary in {(time.time()-t0):.2f}sec")
+def dictionary_status():
+    if dictionary_ready.is_set():
+        return "ready"
+    return "failed" if dictionary_load_error is not None else "loading"
 
 
 def tidy_up_answer(ans):
     ans = ''.join([a for a in ans.upper() if 'A' <= a <= 'Z'])
     return ans
 
-def get_match_phrase_arr(matches):
-    # [
-    #  {'phrase': 'bird', 'score': np.float32(0.8097365)}, 
-    #  {'phrase': 'duck', 'score': np.float32(0.70401174)}, 
-    #  ...
-    # ]
-    return [ match["phrase"].upper() for match in matches ]
-
-
-if True:
-    # 42-0  = "little bird to dart across sill (10)"
-    #          FLEDGELING (little bird) = "FLING" (to dart) outside (across) "LEDGE" (sill)
-    definition='sill'
-    matches = crossword_dictionary.find_nearest_words(
-                     definition, k=10, )
-    print(f"{definition=} {get_match_phrase_arr(matches)}")
-    # ['SILL', 'STRAINING SILL', 'SILLS', 'REAR WINDOW', 'WINDOW LEDGES', 'WALL PLATE', 
-    #  'LAMP CHIMNEY', 'WINDOW *LEDGE*', 'WET PLATE', 'CHIMNEY']
-
-    definition='little bird'
-    matches = crossword_dictionary.find_nearest_words(
-                     definition, k=10, pattern='(10)', substrings=["LEDGE"])
-    print(f"{definition=} {get_match_phrase_arr(matches)}")
-    # [*'FLEDGELING'*, 'PLEDGEABLE', 'LEDGERLINE', 'LEDGERBAIT']
-
-    # 42-1  = "rising star, runner (4)" (down clue)
-    #         reversal (rising+down clue) of "NOVA" (star) = "AVON" (a runner / river!) 
-    definition='star'
-    matches = crossword_dictionary.find_nearest_words(
-                     definition, k=50, pattern='(4)', substrings=[])
-    print(f"{definition=} {get_match_phrase_arr(matches)}")
-    # ['STAR', 'DIVA', 'IDOL', 'HERO', 'FAME', 'STUD', 'HUNK', 'GIRL', 'RING', 'BEAU', 'MOON', 
-    # 'CAST', 'TRIO', 'AFRO', 'CLUB', 'SUNS', 'GLAM', 'ICON', 'FANS', 'ACES', 'SHOT', 'SHOW', 
-    # 'BUFF', 'HALO', 'CHEF', 'FILM', 'LADY', 'TEEN', 'EMMY', 'WEDS', 'WINS', 'LION', 'BABE', 
-    # 'PROM', 'GOER', 'PAIR', 'BALL', 'SEXY', 'TEAM', 'GALA', *'NOVA'*, 'CAPE', 'FLOP', 'TOON', 
-    # 'MUSE', 'PHOT', 'ROCK', 'HITS', 'VAMP', 'FAVE']
-
-    
-
-if False:
-    # 88-0  = "sides from elsewhere overwhelming crack team (6)"
-    #         E+E (sides of ELSEWHERE) with "QUIP" (crack) inside = EQUIPE (team)
-    definition='team'
-    matches = crossword_dictionary.find_nearest_words(
-                     definition, k=10, pattern='(6)', substrings=["QUIP"])
-    print(f"{definition=} {get_match_phrase_arr(matches)}")  
-    # ['EQUIPS', 'QUIPOS', 'QUIPUS']  # Oooof ... not quite!
- 
-    # 88-1 = "is series of lectures spanning two days treated formally? (10)"
-    #        "IS" + "COURSE" (series of lectures) inside (spanning) D+D (two days) = DISCOURSED (treated formally)
-    definition='treated formally'
-    matches = crossword_dictionary.find_nearest_words(
-                     definition, k=10, pattern='(10)', substrings=["COURSE"])  
-    print(f"{definition=} {get_match_phrase_arr(matches)}")  
-    # [*'DISCOURSED'*, 'RACECOURSE', 'DAMPCOURSE', 'FORECOURSE', 'DISCOURSES', 
-    # 'CONCOURSES', 'COURSEWORK', 'GOLFCOURSE', 'LOBSCOURSE', 'DISCOURSER']
-
+def dictionary_self_check(crossword_dictionary, min_overlap=SELF_CHECK_MIN_OVERLAP, verbose=True):
+    """Example queries, to check that the dictionary tool works (see server.py --self-check and --min-parity)
+
+    Each query's results are compared with those recorded from CrosswordDictionary 
+    (src/check-index-parity.py compares them live, over more queries).  Raises ValueError 
+    if the mean overlap is below min_overlap, and returns it otherwise.
+    """
+    queries = [ query for query, _ in SELF_CHECK_QUERIES ]
+    reference_phrases = [ phrases for _, phrases in SELF_CHECK_QUERIES ]
+    results = search_parity(crossword_dictionary, queries, reference_phrases)
+    for result in results:
+        if verbose:
+            print(f"definition={result['definition']!r} {result['phrases']}")
+            print(f"  overlap={result['overlap']:.2f} missing={result['missing']} extra={result['extra']}")
+        if result["missing"]:
+            logger.warning(f"Dictionary self-check : {result['definition']!r} is missing {result['missing']} "
+                           f"(of CrosswordDictionary's results)")
+    mean_overlap = sum(result["overlap"] for result in results)/len(results)
+    if mean_overlap<min_overlap:
+        raise ValueError(f"Dictionary self-check : mean overlap {mean_overlap:.3f} with CrosswordDictionary's "
+                         f"results is below {min_overlap}")
+    return mean_overlap
 
 
 class Agent:
@@ -201,15 +291,18 @@ class Agent:
     # Fill in: list of required config keys, e.g. ["topic", "num_rounds"]
     required_config_keys: list[str] = []  # We have fall-back values for each of these
 
-    def __init__(self):
+    def __init__(self, dictionary_ready_timeout=DICTIONARY_READY_TIMEOUT, checkpoint_store=None, transcript_store=None):
         self.messenger = Messenger()
+        self.dictionary_ready_timeout = dictionary_ready_timeout
+        self.checkpoint_store = checkpoint_store  # Completed results are saved here (if given), and resumed from
+        self.transcript_store = transcript_store  # Solver transcripts are recorded here / replayed from
 
         # Initialize other state here
 
         # Main dictionary / embedding model are loaded globally (above)
 
 
-    def validate_request(self, request: EvalRequest) -> tuple[bool, str]:
+    async def validate_request(self, request: EvalRequest) -> tuple[bool, str]:
         missing_roles = set(self.required_roles) - set(request.participants.keys())
         if missing_roles:
             return False, f"Missing roles: {missing_roles}"
@@ -230,7 +323,9 @@ class Agent:
         else:
             return False, f"Only cryptonite available at present"
         
-        self.dataset = cryptic_dataset.load_cryptonite_dataset(split, dataset_path="./src/cryptonite")
+        # Cached for the whole process (the same splits are requested again and again) : 
+        #   the first request for a split parses it, so that's done off the event loop
+        self.dataset = await asyncio.to_thread(clue_dataset.load_dataset, dataset, split)
 
         try:
             num_tasks = int( request.config.get("num_tasks", "10") )
@@ -243,13 +338,57 @@ class Agent:
         except:
             return False, f"seed must be an integer"
 
+        self.resume = str(request.config.get("resume", "true")).lower() not in ('false', '0', 'no')
+        self.streaming = str(request.config.get("streaming", "false")).lower() in ('true', '1', 'yes')
+
+        self.transcript_mode = str(request.config.get("transcripts", "off"))
+        if self.transcript_mode not in TRANSCRIPT_MODES:
+            return False, f"transcripts must be one of {TRANSCRIPT_MODES}"
+        if self.transcript_mode!="off" and self.transcript_store is None:
+            return False, f"transcripts are not enabled on this server"
+        self.dataset_name, self.split, self.seed = dataset, split, seed
+
+        try:
+            self.max_concurrency = int( request.config.get("max_concurrency", "1") )
+            assert 0<self.max_concurrency
+        except:
+            return False, f"max_concurrency must be a positive integer"
+
+        self.status_mode = str(request.config.get("status_updates", DEFAULT_STATUS_MODE))
+        if self.status_mode not in STATUS_MODES:
+            return False, f"status_updates must be one of {STATUS_MODES}"
+        try:
+            self.status_window = float( request.config.get("status_window", DEFAULT_STATUS_WINDOW) )
+            self.status_max_chars = int( request.config.get("status_max_chars", DEFAULT_STATUS_MAX_CHARS) )
+            assert 0<=self.status_window and 0<=self.status_max_chars
+        except:
+            return False, f"status_window and status_max_chars must be non-negative numbers"
+
+        # How the clues share solver conversations (separate conversations are needed for concurrent clues)
+        self.context_policy = str(request.config.get("context", "shared" if self.max_concurrency==1 else "fresh"))
+        if self.context_policy not in CONTEXT_POLICIES:
+            return False, f"context must be one of {CONTEXT_POLICIES}"
+        if self.context_policy!="fresh" and self.max_concurrency>1:
+            return False, f"context={self.context_policy} needs max_concurrency=1"
+        try:
+            self.context_window = int( request.config.get("context_window", DEFAULT_CONTEXT_WINDOW) )
+            assert 0<self.context_window
+        except:
+            return False, f"context_window must be a positive integer"
+
         # This ensures a stable order for shuffled dataset
-        shuffled_idx = cryptic_dataset.get_shuffled_idx(self.dataset, seed=seed)
-        self.task_indices = shuffled_idx[:num_tasks]  
+        shuffled_idx = await asyncio.to_thread(clue_dataset.get_shuffled_idx, dataset, split, seed)
+        self.task_indices = list(shuffled_idx[:num_tasks])
 
         return True, "ok"
 
 
+    def result_config_hash(self):
+        """Hash of the (validated) config that affects the results, other than the clues themselves"""
+        result_config = dict(context=self.context_policy, context_window=self.context_window, streaming=self.streaming)
+        return hashlib.sha1(json.dumps(result_config, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
     async def run(self, message: Message, updater: TaskUpdater) -> None:
         """Implement your agent logic here.
 
@@ -265,7 +404,7 @@ class Agent:
 
         try:
             request: EvalRequest = EvalRequest.model_validate_json(input_text)
-            ok, msg = self.validate_request(request)
+            ok, msg = await self.validate_request(request)
             if not ok:
                 await updater.reject(new_agent_text_message(msg))
                 return
@@ -280,6 +419,15 @@ class Agent:
         # Use request.participants to get participant agent URLs by role
         # Use request.config for assessment parameters
 
+        # Evaluations are queued until the dictionary tool has loaded (rejected if it doesn't)
+        if not dictionary_ready.is_set():
+            await updater.update_status(
+                TaskState.working, new_agent_text_message("Waiting for the dictionary tool to load")
+            )
+            if not await wait_for_dictionary(timeout=self.dictionary_ready_timeout):
+                await updater.reject(new_agent_text_message(f"Dictionary tool not available ({dictionary_status()})"))
+                return
+
         agent_url = str(request.participants["crypticreasoner_solver"])
         logger.info(f"Running {len(self.task_indices)} tasks")
 
@@ -288,40 +436,144 @@ class Agent:
             new_agent_text_message(f"Starting evaluation of {len(self.task_indices)} tasks")
         )
 
-        # Iterate through each task
-        try: 
-            result_arr=[]
-            preamble = task_evaluation_preamble  # See above for this prompt
-            for num_task, task_idx in enumerate(self.task_indices):
-                logger.info(f"Running task[{num_task}] (has id {task_idx})")
-                await updater.update_status(
-                    TaskState.working,
-                    new_agent_text_message(f"Running task[{num_task}] (has id {task_idx})")
+        # Working-status updates are merged (and truncated) so that many concurrent tasks don't flood the event queue
+        status = StatusCoalescer(updater, mode=self.status_mode, window=self.status_window, max_chars=self.status_max_chars)
+
+        # Run the tasks, at most self.max_concurrency at a time
+        #   With max_concurrency==1, all the tasks share a single solver conversation
+        #   (and the preamble is only sent with the first task).  Otherwise, each task
+        #   gets its own conversation (and its own copy of the preamble)
+        # Only each task's ids and score are kept (in task_indices order) : the full results are emitted as they finish
+        task_scores = [None]*len(self.task_indices)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        summary = dict(num_tasks=len(self.task_indices), num_completed=0, num_resumed=0, num_errors=0, total_score=0, turns=0, tool_calls=0,
+                       prompt_bytes=0, max_context_bytes=0)
+
+        # Tasks already scored for this (participant, dataset, split, seed, and the rest of the config that 
+        #   affects the results) are not sent to the solver again.  Transcripts are just the solver's responses
+        transcript_key = (agent_url, self.dataset_name, self.split, self.seed)
+        checkpoint_key = transcript_key+(self.result_config_hash(),)
+        checkpointed = dict()
+
+        # In replay mode, the recorded solver responses are used (re-scoring them, without any network calls)
+        replaying = (self.transcript_mode=="replay")
+        if replaying:
+            try:
+                recorded = await asyncio.to_thread(self.transcript_store.load, transcript_key)
+            except FileNotFoundError as e:
+                await updater.reject(new_agent_text_message(f"{e}"))
+                return
+        checkpointing = (self.checkpoint_store is not None and not replaying)
+
+        if checkpointing and self.resume:
+            checkpointed = await asyncio.to_thread(self.checkpoint_store.get_results, *checkpoint_key)
+            num_resuming = len(set(self.task_indices) & set(checkpointed))
+            logger.info(f"Resuming : {num_resuming} tasks already completed")
+            if num_resuming>0:
+                await updater.update_status(TaskState.working, new_agent_text_message(
+                    f"Resuming : {num_resuming} tasks were already scored with this config (their results are marked "
+                    f"'resumed') : add \"resume\": false to the config to score them again"))
+        conversation = dict(clues=0, bytes=0)  # The solver conversation shared by sequential clues
+
+        async def run_task(num_task, task_idx):
+            async with semaphore:
+                if task_idx in checkpointed:
+                    result = dict(num_task=num_task, task_idx=int(task_idx), resumed=True, **checkpointed[task_idx])
+                    summary["num_resumed"] += 1
+                else:
+                    logger.info(f"Running task[{num_task}] (has id {task_idx})")
+                    await status.update(f"Running task[{num_task}] (has id {task_idx})")
+                    if self.max_concurrency==1:
+                        messenger = self.messenger
+                        messenger.streaming = self.streaming
+                        window = dict(shared=None, fresh=1, rolling=self.context_window)[self.context_policy]
+                        if window is not None and conversation["clues"]>=window:
+                            messenger.reset()  # Start a new conversation
+                            conversation.update(clues=0, bytes=0)
+                        # The preamble is only needed for the first clue of each conversation
+                        preamble = task_evaluation_preamble if conversation["clues"]==0 else ""
+                        conversation["clues"] += 1
+                        task_conversation = conversation
+                    else:
+                        messenger = Messenger(streaming=self.streaming)  # A separate conversation for each task
+                        preamble = task_evaluation_preamble
+                        task_conversation = dict(clues=1, bytes=0)
+                    try:
+                        if replaying:
+                            # eg: the task was resumed from a checkpoint (so never sent to the solver) when recording
+                            if int(task_idx) not in recorded:
+                                raise LookupError(f"No transcript recorded for task {task_idx}")
+                            messenger = ReplayMessenger(recorded[int(task_idx)])
+                        elif self.transcript_mode=="record":
+                            messenger = RecordingMessenger(messenger, self.transcript_store, transcript_key, int(task_idx))
+                        result = await self.run_single_task(
+                            agent_url, status, self.dataset[task_idx], preamble, messenger=messenger,
+                            conversation=task_conversation)
+                    except Exception as e:
+                        # One clue failing (e.g. the solver erroring) doesn't cancel the others that are in flight
+                        logger.exception(f"Task[{num_task}] (has id {task_idx}) failed : {e!r}")
+                        result = dict(score=0, critique="", turns=0, tool_calls=0, error=repr(e))
+                        summary["num_errors"] += 1
+                    if checkpointing and "error" not in result:  # Failed tasks are retried on resume
+                        await asyncio.to_thread(self.checkpoint_store.put_result, *checkpoint_key, int(task_idx), result)
+                    result = dict(num_task=num_task, task_idx=int(task_idx), **result)
+                task_scores[num_task] = dict(num_task=num_task, task_idx=int(task_idx), score=result["score"],
+                    **{ key: result[key] for key in ["resumed", "error"] if key in result })
+
+                # Each task's result is emitted as soon as it is available (so a crash later doesn't lose it)
+                summary["num_completed"] += 1
+                summary["total_score"] += result["score"]
+                summary["turns"] += result["turns"]
+                summary["tool_calls"] += result["tool_calls"]
+                summary["prompt_bytes"] += sum(result.get("prompt_bytes", []))
+                summary["max_context_bytes"] = max(summary["max_context_bytes"], *result.get("context_bytes", [0]))
+                await updater.add_artifact(
+                    parts=[Part(root=DataPart(data=result))],
+                    name="Task result",
+                    artifact_id=f"task-result-{num_task}",
                 )
-                result = await self.run_single_task(agent_url, updater, self.dataset[task_idx], preamble)
-                result_arr.append(result)
+                await status.update(f"Finished task[{num_task}] (has id {task_idx}) : score={result['score']} "+
+                    f"({summary['num_completed']}/{summary['num_tasks']} done, total score={summary['total_score']})",
+                    progress=True)
 
-                preamble = ""  # Use for just the first task
+        try: 
+            async with asyncio.TaskGroup() as task_group:
+                for num_task, task_idx in enumerate(self.task_indices):
+                    task_group.create_task(run_task(num_task, task_idx))
 
         except Exception as e:
-            print("** Green Agent fail **")
-            print(e)
+            errors = e.exceptions if isinstance(e, ExceptionGroup) else [e]  # The TaskGroup wraps them
+            for error in errors:
+                logger.error("** Green Agent fail **", exc_info=error)
+            summary["errors"] = [ repr(error) for error in errors ]
         finally:
             pass 
 
+        await status.close()
+        logger.info(f"dictionary_search cache : {dictionary_search.cache_stats()}")
+        logger.info(f"dictionary_search batches : {dictionary_search.batch_stats()}")
+
+        summary["accuracy"] = summary["total_score"]/summary["num_tasks"] if summary["num_tasks"]>0 else 0.
         await updater.add_artifact(
             parts=[
                 Part(root=TextPart(text="The agent completed the tasks.")),
                 Part(root=DataPart(data={
-                    # structured assessment results
-                    "results": result_arr,
+                    # structured assessment results (the full per-task results are in the "Task result" artifacts)
+                    "results": [ task for task in task_scores if task is not None ],
+                    "summary": summary,
                 }))
             ],
             name="Result",
         )
+        if "errors" in summary:  # The evaluation itself failed partway (rather than some of its clues)
+            await updater.failed(new_agent_text_message(f"Evaluation failed : {'; '.join(summary['errors'])}"))
 
-    def parse_json_segment(self, response):
-        #logger.info(f"Attempting to parse : {response}")
+    def find_json_segment(self, response, complete=False):
+        """The text of the last <json> (or ```json) segment in response, or None
+
+        With complete=True, a segment counts only once its closing tag has arrived
+        (a streamed response may still be partway through it).
+        """
         for tag_start in [ '<json>', '```json' ]:
             json_start = response.rfind(tag_start)
             if json_start<0:
@@ -334,15 +586,20 @@ class Agent:
                     #print(f"found {json_end=}")
                     break
             if json_end<0:
+                if complete:
+                    return None
                 json_end = len(response)  # Maximum extent...
-            break # Finished
+            return response[json_start:json_end]
+        return None
 
-        if json_start<0:  # Failure!
+    def parse_json_segment(self, response):
+        #logger.info(f"Attempting to parse : {response}")
+        json_segment = self.find_json_segment(response)
+        if json_segment is None:  # Failure!
             logger.warning(f"No JSON segment found in : {response}")
             return dict()
 
         try:
-            json_segment = response[json_start:json_end]
             #logger.info(f"JSON segment : {json_segment}")
             action_dict = json.loads(json_segment)  
 
@@ -353,18 +610,141 @@ class Agent:
 
         return action_dict
 
+    def get_actions(self, action, action_name):
+        """The action_name tool calls in a parsed response (a single call, or a list of calls)"""
+        action_names = action_name if isinstance(action_name, list) else [action_name]
+        actions = [ a for a in (action if isinstance(action, list) else [action]) if isinstance(a, dict) ]
+        return [ a for a in actions if a.get("name", '') in action_names ]
+
+    def get_tool_calls(self, action):
+        """The tool calls to run for a parsed response ([] if it gives an answer, or has no tool calls)
 
-    async def run_single_task(self, agent_url, updater, data_item, preamble="", max_turns=20):
+        Every entry of a list of calls is included (malformed ones get an error result), 
+        so that the results line up with the calls.
+        """
+        if self.get_actions(action, ANSWER_ACTION_NAME):
+            return []
+        if isinstance(action, list):
+            return action
+        return self.get_actions(action, TOOL_ACTION_NAMES)
+
+    def tool_call_error(self, call):
+        """Why a tool call can't be run (or None if it can)"""
+        if not isinstance(call, dict):
+            return "Each tool call must be a JSON object with a name and arguments"
+        name, arguments = call.get("name"), call.get("arguments")
+        if name not in TOOL_ARGUMENTS:
+            return f"Unknown tool {name!r} : use one of {TOOL_ACTION_NAMES}"
+        if not isinstance(arguments, dict):
+            return f"{name} needs its arguments as a JSON object"
+        required, optional = TOOL_ARGUMENTS[name]
+        for argument in required:
+            if not isinstance(arguments.get(argument), str) or not arguments[argument].strip():
+                return f"{name} needs a {argument} string"
+        for argument in optional:
+            value = arguments.get(argument)
+            if value is None or isinstance(value, str) or (argument=="pattern" and isinstance(value, int)):
+                continue
+            if argument=="substrings" and isinstance(value, list) and all(isinstance(v, str) for v in value):
+                continue
+            return f"{name} argument {argument} must be a string"
+        pattern = arguments.get("pattern")
+        if pattern is not None and str(pattern).strip() and canonical_pattern(pattern) is None:
+            return (f"{name} pattern {pattern!r} isn't understood : use an enumeration like (8) or (4,4), "
+                    f"or a letter pattern like ?L?D?E???? (with ? for each unknown letter)")
+        return None
+
+    async def run_tool_call(self, call):
+        error = self.tool_call_error(call)
+        if error is not None:
+            conversation_logger.info(f"** Bad tool call : {error} **")
+            return {"error": error}
+        if call["name"]==ANAGRAM_ACTION_NAME:
+            return await self.anagram_tool(call["arguments"])
+        return await self.search_tool(call["arguments"])
+
+    async def run_searches(self, search_actions):
+        # The searches run concurrently (and so can share a dictionary_search batch)
+        results = await asyncio.gather(*[ self.run_tool_call(a) for a in search_actions[:MAX_SEARCHES_PER_TURN] ])
+        return results+[ {"error": f"Only {MAX_SEARCHES_PER_TURN} tool calls are run in each turn"}
+                         for _ in search_actions[MAX_SEARCHES_PER_TURN:] ]
+
+
+    async def search_tool(self, arguments):
+        definition = arguments["definition"]
+        pattern = arguments.get("pattern", None)
+        substrings = arguments.get("substrings") or ""
+        if isinstance(substrings, str):
+            substrings = substrings.split(',')  # An array of strings
+
+        conversation_logger.info(f"** {SEARCH_ACTION_NAME} response : {definition=} {pattern=} {substrings=} **")
+        nearest_matches = await dictionary_search.find_nearest_words(
+            definition, k=10, pattern=pattern, substrings=substrings)
+        #print(nearest_matches)
+        # [
+        #  {'phrase': 'bird', 'score': np.float32(0.8097365)}, 
+        #  {'phrase': 'duck', 'score': np.float32(0.70401174)}, 
+        #  ...
+        # ]
+        return {"nearest_matches": [ match["phrase"].upper() for match in nearest_matches ]}
+
+
+    async def anagram_tool(self, arguments):
+        letters = arguments["letters"]
+        pattern = arguments.get("pattern", None)
+        definition = arguments.get("definition", None)
+
+        conversation_logger.info(f"** {ANAGRAM_ACTION_NAME} response : {letters=} {pattern=} {definition=} **")
+        anagrams = await dictionary_search.find_anagrams(letters, pattern=pattern, definition=definition)
+        return {"anagrams": [ match["phrase"].upper() for match in anagrams[:MAX_ANAGRAMS] ]}
+
+
+    async def run_single_task(self, agent_url, status, data_item, preamble="", max_turns=20, messenger=None,
+                              conversation=None):
         #print(data_item)
+        messenger = messenger or self.messenger
+        conversation = conversation if conversation is not None else dict(bytes=0)  # Size of the solver conversation so far
+        solver_turns = 0
+        prompt_bytes, context_bytes = [], []  # For each turn : the prompt size, and the conversation size (including it)
+        turn_seconds = []  # For each turn : the time since the previous turn's response (so including our own processing)
+        prefetched = dict()  # json segment -> the (already running) searches it asks for
+
+        def on_text(text: str):
+            # Start the searches as soon as a complete tool call has arrived (without waiting for any trailing text)
+            json_segment = self.find_json_segment(text, complete=True)
+            if json_segment is None or json_segment in prefetched:
+                return
+            try:
+                action = json.loads(json_segment)
+            except json.JSONDecodeError:
+                return
+            search_actions = self.get_tool_calls(action)
+            if search_actions:
+                prefetched[json_segment] = asyncio.create_task(self.run_searches(search_actions))
+
+        async def cancel_prefetched():
+            # Searches for tool calls that the complete response superseded are not needed
+            for task in prefetched.values():
+                task.cancel()
+            await asyncio.gather(*prefetched.values(), return_exceptions=True)
+            prefetched.clear()
+
         async def agent_turn(prompt: str) -> str:
-            response = await self.messenger.talk_to_agent(
-                prompt, agent_url, new_conversation=False
-            )
-            logger.info(f"{agent_url}: {response}")
+            nonlocal solver_turns, last_response_time
+            solver_turns += 1
+            prompt_bytes.append(len(prompt.encode('utf-8')))
+            conversation["bytes"] += prompt_bytes[-1]
+            context_bytes.append(conversation["bytes"])
+            with TASK_PHASE_SECONDS.time(phase="solver"):
+                response = await messenger.talk_to_agent(
+                    prompt, agent_url, new_conversation=False, on_text=on_text
+                )
+            conversation["bytes"] += len(response.encode('utf-8'))
             #debate[role].append(response)
-            await updater.update_status(
-                TaskState.working, new_agent_text_message(f"{agent_url}: {response}")
-            )
+            with TASK_PHASE_SECONDS.time(phase="status"):
+                await status.update(f"{agent_url}: {response}")  # The full text goes to the conversation log
+            turn_seconds.append(round(time.time()-last_response_time, 3))
+            last_response_time = time.time()
             return response
 
         # Opening with the question
@@ -381,54 +761,71 @@ class Agent:
         answer_setter = tidy_up_answer(data_item['answer'])
 
         logger.info(f"{agent_url}: {clue_prompt=} {answer_setter=}")
-        response = await agent_turn( preamble+clue_prompt )
-
-        turn, score = 0, 0
-        while turn<max_turns:
-            action_dict = self.parse_json_segment(response)
-            action_name = action_dict.get("name", '')
-
-            if action_name == ANSWER_ACTION_NAME:
-                answer_solver = action_dict["arguments"]["answer"]
-                answer_solver = tidy_up_answer(answer_solver)
-                if answer_solver == answer_setter:
-                    score = 1  # Success!
-                break
-
-            elif action_name == SEARCH_ACTION_NAME:
-                definition = action_dict["arguments"]["definition"]
-                pattern = action_dict["arguments"].get("pattern", None)
-                substrings = action_dict["arguments"].get("substrings", "").split(',')  # An array of strings
-
-                print(f"** {SEARCH_ACTION_NAME} response : {definition=} {pattern=} {substrings=} **")
-                nearest_matches = crossword_dictionary.find_nearest_words(
-                    definition, k=10, pattern=pattern, substrings=substrings)
-                #print(nearest_matches)
-                # [
-                #  {'phrase': 'bird', 'score': np.float32(0.8097365)}, 
-                #  {'phrase': 'duck', 'score': np.float32(0.70401174)}, 
-                #  ...
-                # ]
-                nearest_match_phrase_arr = [ match["phrase"].upper() for match in nearest_matches ]
-
-                # Return the tool call result
-                result_str = f"""
+        t_start = last_response_time = time.time()
+        turn, score, tool_calls = 0, 0, 0
+        try:  # Searches started while a response streams in are cancelled, however this ends
+            response = await agent_turn( preamble+clue_prompt )
+
+            while turn<max_turns:  # Each turn is one round-trip to the solver, however many tool calls it makes
+                with TASK_PHASE_SECONDS.time(phase="parse"):
+                    json_segment = self.find_json_segment(response)
+                    action = self.parse_json_segment(response)
+                    answer_actions = self.get_actions(action, ANSWER_ACTION_NAME)
+                    search_actions = self.get_tool_calls(action)
+                prefetched_searches = prefetched.pop(json_segment, None)
+                await cancel_prefetched()
+
+                if answer_actions:
+                    arguments = answer_actions[0].get("arguments")
+                    if isinstance(arguments, dict) and isinstance(arguments.get("answer"), str):
+                        answer_solver = tidy_up_answer(arguments["answer"])
+                        if answer_solver == answer_setter:
+                            score = 1  # Success!
+                        break
+                    response = await agent_turn(f"Please continue... (The {ANSWER_ACTION_NAME} call needs an answer string argument)")
+
+                elif search_actions:
+                    if len(search_actions)>MAX_SEARCHES_PER_TURN:
+                        logger.warning(f"{agent_url}: {len(search_actions)} searches in one turn, only {MAX_SEARCHES_PER_TURN} run")
+                    tool_calls += sum([ self.tool_call_error(a) is None for a in search_actions[:MAX_SEARCHES_PER_TURN] ])
+                    with TASK_PHASE_SECONDS.time(phase="search"):
+                        if prefetched_searches is not None:  # Already started while the response was streaming in
+                            results = await prefetched_searches
+                        else:
+                            results = await self.run_searches(search_actions)
+                    if not isinstance(action, list):
+                        results = results[0]  # A single call gets a single result
+
+                    # Return the tool call result(s)
+                    result_str = f"""
 <json>
-{json.dumps({"nearest_matches": nearest_match_phrase_arr}, indent=2)}
+{json.dumps(results, indent=2)}
 </json>
 """.strip()
-                print(result_str)
+                    conversation_logger.info(result_str)
 
-                response = await agent_turn(result_str)
+                    response = await agent_turn(result_str)
 
-            else:
-                response = await agent_turn("Please continue... (You must use function calls within <json></json> tags)")
-                # Otherwise, just swallow the bad tool call... 
+                else:
+                    response = await agent_turn("Please continue... (You must use function calls within <json></json> tags)")
+                    # Otherwise, just swallow the bad tool call... 
+
+                turn+=1
+        finally:
+            await cancel_prefetched()
 
-            turn+=1
+        TASK_SECONDS.observe(time.time()-t_start)
+        TASK_TURNS.observe(solver_turns)
+        TASK_TOOL_CALLS.observe(tool_calls)
 
         return dict(
             score=score, 
             critique="",
+            turns=solver_turns,
+            tool_calls=tool_calls,
+            elapsed=round(time.time()-t_start, 3),
+            prompt_bytes=prompt_bytes,
+            context_bytes=context_bytes,
+            turn_seconds=turn_seconds,
         )
 
@@ -0,0 +1,28 @@
+import argparse
+import json
+
+import clue_dataset
+from phrase_index import PhraseEmbedder, load_phrase_index, ann_recall
+
+# Compare the IVF (approximate) dictionary search against the exact search, to choose --ann-nprobe
+#   The queries are the first and last words of Cryptonite clues (where the definition usually is)
+#   e.g. : uv run src/check-ann-recall.py  (paths are relative to the repo root, like the server's)
+
+parser = argparse.ArgumentParser(description="Measure recall@k of the IVF dictionary search.")
+parser.add_argument("--model-file", type=str, default="./src/cc.en.100.bin", help="fastText embeddings model")
+parser.add_argument("--index-dir", type=str, default="./src/ukacd-index", help="Directory containing the phrase index")
+parser.add_argument("--split", type=str, default="val", help="Cryptonite split to draw the queries from")
+parser.add_argument("--seed", type=int, default=42, help="Seed for choosing the clues")
+parser.add_argument("--num-clues", type=int, default=500, help="Number of clues to draw the queries from")
+parser.add_argument("--k", type=int, default=10, help="Number of results compared")
+parser.add_argument("--nprobe", type=int, nargs='+', default=[1, 4, 16, 32, 64, 128], help="nprobe values to try")
+args = parser.parse_args()
+
+queries = [ definition for clue in clue_dataset.sample_clues("cryptonite", args.split, args.seed, args.num_clues)
+            for definition in clue_dataset.definition_candidates(clue['clue']) ]
+
+phrase_index = load_phrase_index(args.index_dir, PhraseEmbedder(model_file=args.model_file))
+print(f"{len(queries)} queries against {len(phrase_index)} phrases ({len(phrase_index.ivf_centroids)} IVF lists)")
+
+for result in ann_recall(phrase_index, queries, k=args.k, nprobe_values=args.nprobe):
+    print(json.dumps(result))
@@ -0,0 +1,56 @@
+import sys
+import argparse
+import json
+
+import numpy as np
+
+import clue_dataset
+from phrase_index import PhraseEmbedder, load_phrase_index, phrase_words, search_parity, SELF_CHECK_QUERIES, SELF_CHECK_MIN_OVERLAP
+
+# Compare the phrase index's dictionary search with CrosswordDictionary's (the original, exhaustive one)
+#   The queries are the self-check ones, plus the first and last words of Cryptonite clues (where the
+#   definition usually is), constrained by the answer's enumeration, and then also by a substring of it
+#   e.g. : uv run src/check-index-parity.py  (paths are relative to the repo root, like the server's)
+
+parser = argparse.ArgumentParser(description="Measure the overlap of the phrase index's dictionary search with CrosswordDictionary's.")
+parser.add_argument("--model-file", type=str, default="./src/cc.en.100.bin", help="fastText embeddings model")
+parser.add_argument("--dictionary-file", type=str, default="./src/UKACD.txt", help="Crossword dictionary (for CrosswordDictionary)")
+parser.add_argument("--index-dir", type=str, default="./src/ukacd-index", help="Directory containing the phrase index")
+parser.add_argument("--split", type=str, default="val", help="Cryptonite split to draw the queries from")
+parser.add_argument("--seed", type=int, default=42, help="Seed for choosing the clues")
+parser.add_argument("--num-clues", type=int, default=100, help="Number of clues to draw the queries from")
+parser.add_argument("--k", type=int, default=10, help="Number of results compared")
+parser.add_argument("--min-overlap", type=float, default=SELF_CHECK_MIN_OVERLAP, help="Exit with an error if the mean overlap is below this")
+args = parser.parse_args()
+
+queries = [ query for query, _ in SELF_CHECK_QUERIES ]
+for clue in clue_dataset.sample_clues("cryptonite", args.split, args.seed, args.num_clues):
+    answer_word = max(phrase_words(clue['answer']), key=len, default='')
+    for definition in clue_dataset.definition_candidates(clue['clue']):
+        queries.append(dict(definition=definition, k=args.k, pattern=clue['enumeration']))
+        if len(answer_word)>=4:
+            queries.append(dict(definition=definition, k=args.k, pattern=clue['enumeration'], substrings=[answer_word[1:4]]))
+
+cryptic_corpora = clue_dataset.get_cryptic_corpora()
+vector_embedder = cryptic_corpora.VectorEmbedder(model_file=args.model_file)
+crossword_dictionary = cryptic_corpora.CrosswordDictionary(
+    vector_embedder, crossword_dictionary_file=args.dictionary_file, strip_header=False)
+reference_phrases = [
+    [ match["phrase"] for match in crossword_dictionary.find_nearest_words(
+        query["definition"], k=query.get("k", 10), pattern=query.get("pattern"), substrings=query.get("substrings")) ]
+    for query in queries
+]
+
+phrase_index = load_phrase_index(args.index_dir, PhraseEmbedder(model_file=args.model_file))
+print(f"{len(queries)} queries against {len(phrase_index)} phrases")
+
+results = search_parity(phrase_index, queries, reference_phrases)
+for result in results:
+    if result["missing"] or result["extra"]:
+        print(json.dumps(result))
+
+mean_overlap = float(np.mean([ result["overlap"] for result in results ]))
+unchanged = float(np.mean([ not result["missing"] and not result["extra"] for result in results ]))
+print(json.dumps(dict(overlap=mean_overlap, unchanged=unchanged)))
+if mean_overlap<args.min_overlap:
+    sys.exit(f"Mean overlap {mean_overlap:.3f} is below --min-overlap {args.min_overlap}")
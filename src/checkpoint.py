@@ -0,0 +1,57 @@
+import json
+import sqlite3
+import threading
+
+import logging
+logger = logging.getLogger("crypticreasoner_setter")
+
+
+DEFAULT_CHECKPOINT_FILE = "./src/checkpoints.sqlite"  # Used if server.py --checkpoint-file is given without a file
+
+
+class CheckpointStore:
+    """Completed task results, keyed by (participant, dataset, split, seed, config, task_idx)
+
+    Results are written as each task finishes, so that a resubmitted evaluation (with
+    the same config) can skip the clues that have already been scored.  config is a hash 
+    of the rest of the config that affects the results (see Agent.result_config_hash).
+    """
+    def __init__(self, checkpoint_file: str = DEFAULT_CHECKPOINT_FILE):
+        self.checkpoint_file = checkpoint_file
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(checkpoint_file, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS task_results (
+                participant TEXT NOT NULL,
+                dataset TEXT NOT NULL,
+                split TEXT NOT NULL,
+                seed INTEGER NOT NULL,
+                config TEXT NOT NULL,
+                task_idx INTEGER NOT NULL,
+                result TEXT NOT NULL,
+                PRIMARY KEY (participant, dataset, split, seed, config, task_idx)
+            )""")
+        self._db.commit()
+
+    def get_results(self, participant: str, dataset: str, split: str, seed: int, config: str) -> dict[int, dict]:
+        """task_idx -> result, for every task already completed with this config"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT task_idx, result FROM task_results WHERE participant=? AND dataset=? AND split=? AND seed=? AND config=?",
+                (participant, dataset, split, seed, config),
+            ).fetchall()
+        return { task_idx: json.loads(result) for task_idx, result in rows }
+
+    def put_result(self, participant: str, dataset: str, split: str, seed: int, config: str, task_idx: int, result: dict):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO task_results (participant, dataset, split, seed, config, task_idx, result) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (participant, dataset, split, seed, config, task_idx, json.dumps(result)),
+            )
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,149 @@
+import os, re, sys, time
+import json
+import shutil, tempfile
+import threading
+import functools
+from uuid import uuid4
+
+import numpy as np
+
+import logging
+logger = logging.getLogger("crypticreasoner_setter")
+
+cryptic_repo="./src/cryptic-crossword-reasoning-verifier"
+
+
+def get_cryptic_dataset():
+    """The solver repo's dataset module : imported on first use, since it's only needed to parse a split"""
+    if cryptic_repo not in sys.path:
+        sys.path.append(cryptic_repo)
+    from solver import dataset as cryptic_dataset
+    return cryptic_dataset
+
+
+def get_cryptic_corpora():
+    """The solver repo's corpora module (with the original CrosswordDictionary), for the check-* scripts"""
+    if cryptic_repo not in sys.path:
+        sys.path.append(cryptic_repo)
+    from solver import corpora as cryptic_corpora
+    return cryptic_corpora
+
+
+# Bump this whenever the on-disk layout changes : stale column files are rebuilt
+COLUMNS_FORMAT_VERSION = 1
+
+# The fields of each clue that the evaluation uses, stored column-wise as utf-8 blobs + offsets
+COLUMNS = ["clue", "answer", "enumeration", "orientation"]
+
+DATASET_PATHS = dict(
+    cryptonite="./src/cryptonite",
+)
+COLUMNS_DIR = "./src/dataset-columns"  # Remove this directory if the source datasets change
+
+
+class ClueDataset:
+    """A read-only sequence of clues, backed by memory-mapped columns (shared between worker processes)"""
+    def __init__(self, columns):
+        self.columns = columns  # column -> (utf-8 blob, offsets)
+
+    def __len__(self):
+        return len(self.columns[COLUMNS[0]][1])-1
+
+    def get(self, i, column):
+        blob, offsets = self.columns[column]
+        return bytes(blob[offsets[i]:offsets[i+1]]).decode('utf-8')
+
+    def __getitem__(self, i):
+        if not 0<=i<len(self):
+            raise IndexError(i)
+        return { column: self.get(i, column) for column in COLUMNS }
+
+
+def write_columns(items, columns_dir):
+    """Written into a temporary directory, then moved into place : files that are already 
+    memory-mapped (by this process, or another one) are never truncated or rewritten"""
+    parent_dir = os.path.dirname(os.path.normpath(columns_dir))
+    os.makedirs(parent_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=parent_dir, prefix=os.path.basename(os.path.normpath(columns_dir))+".tmp-")
+    for column in COLUMNS:
+        values = [ str(item.get(column) or '').encode('utf-8') for item in items ]
+        offsets = np.zeros(len(values)+1, dtype=np.int64)
+        offsets[1:] = np.cumsum([ len(v) for v in values ])
+        np.save(os.path.join(tmp_dir, f"{column}_offsets.npy"), offsets)
+        with open(os.path.join(tmp_dir, f"{column}.bin"), 'wb') as f:
+            f.write(b''.join(values))
+    with open(os.path.join(tmp_dir, "meta.json"), 'wt') as f:  # Written last
+        json.dump(dict(format_version=COLUMNS_FORMAT_VERSION, count=len(items)), f)
+
+    old_dir = None
+    if os.path.exists(columns_dir):  # Stale columns : moved aside (their mapped files stay readable until unmapped)
+        old_dir = f"{columns_dir}.old-{uuid4().hex}"
+        os.replace(columns_dir, old_dir)
+    try:
+        os.replace(tmp_dir, columns_dir)
+    except OSError:  # Another process moved its (identical) columns into place first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    if old_dir is not None:
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def read_columns(columns_dir):
+    meta_file = os.path.join(columns_dir, "meta.json")
+    if not os.path.isfile(meta_file):
+        return None
+    with open(meta_file, 'rt') as f:
+        if json.load(f).get("format_version") != COLUMNS_FORMAT_VERSION:
+            return None
+    return ClueDataset({
+        column: (memmap_blob(os.path.join(columns_dir, f"{column}.bin")),
+                 np.load(os.path.join(columns_dir, f"{column}_offsets.npy"), mmap_mode='r'))
+        for column in COLUMNS
+    })
+
+
+def memmap_blob(blob_file):
+    if os.path.getsize(blob_file)==0:  # np.memmap can't map an empty file
+        return np.zeros(0, dtype=np.uint8)
+    return np.memmap(blob_file, dtype=np.uint8, mode='r')
+
+
+_load_lock = threading.Lock()
+
+def load_dataset(dataset, split):
+    """The (dataset, split) clues : parsed once per process, and stored column-wise for the next process"""
+    with _load_lock:  # Concurrent first calls (eg: validate_request's threads) mustn't each parse and write it
+        return _load_dataset(dataset, split)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_dataset(dataset, split):
+    t0=time.time()
+    columns_dir = os.path.join(COLUMNS_DIR, dataset, split)
+    clues = read_columns(columns_dir)
+    if clues is None:
+        items = get_cryptic_dataset().load_cryptonite_dataset(split, dataset_path=DATASET_PATHS[dataset])
+        write_columns(items, columns_dir)
+        clues = read_columns(columns_dir)
+    logger.info(f"Loaded {dataset}/{split} ({len(clues)} clues) in {(time.time()-t0):.3f}sec")
+    return clues
+
+
+@functools.lru_cache(maxsize=64)
+def get_shuffled_idx(dataset, split, seed):
+    """A stable (for each seed) shuffled order of the (dataset, split) clues"""
+    return tuple(get_cryptic_dataset().get_shuffled_idx(load_dataset(dataset, split), seed=seed))
+
+
+def sample_clues(dataset, split, seed, num_clues):
+    """The first num_clues (dataset, split) clues in the seed's shuffled order (for the check-* and benchmark scripts)"""
+    clues = load_dataset(dataset, split)
+    return [ clues[idx] for idx in get_shuffled_idx(dataset, split, seed)[:num_clues] ]
+
+
+def definition_candidates(clue):
+    """The first and last words of a clue (where the definition usually is) : eg: 
+    'rising star, runner (4)' -> ['rising', 'runner']"""
+    words = re.sub(r'\([\d,\- ]+\)\s*$', '', clue).lower().split()
+    words = [ w.strip('.,;:!?"\'') for w in words ]
+    words = [ w for w in words if w ]
+    return sorted(set(words[:1]+words[-1:]))
@@ -0,0 +1,256 @@
+import time
+import asyncio
+import multiprocessing
+import concurrent.futures
+from collections import OrderedDict, Counter
+
+from phrase_index import canonical_pattern, phrase_letters, anagram_signature
+from metrics import SEARCH_SECONDS, SEARCH_CACHE, SEARCH_BATCH_SIZE
+
+import logging
+logger = logging.getLogger("crypticreasoner_setter")
+
+
+SEARCH_POOL_TYPES = ["thread", "process"]
+DEFAULT_SEARCH_POOL = "thread"
+DEFAULT_SEARCH_WORKERS = 4
+DEFAULT_CACHE_SIZE = 10000  # Maximum number of cached search results (0 disables the cache)
+DEFAULT_CACHE_TTL = 0  # Seconds before a cached result expires (0 means never)
+DEFAULT_BATCH_SIZE = 16  # Maximum number of queries searched together (1 disables batching)
+DEFAULT_BATCH_WAIT = 0.002  # Seconds a query waits for others to arrive before its batch is searched
+
+
+def normalize_query(definition, pattern=None, substrings=None):
+    """(definition, pattern, substrings) in the form used both for searching and as the cache key"""
+    definition = ' '.join(definition.lower().split())
+    substrings = tuple(sorted(set(
+        substring.strip().upper() for substring in (substrings or []) if substring.strip()
+    )))
+    return definition, canonical_pattern(pattern), substrings
+
+
+class LRUCache:
+    """Bounded least-recently-used cache, with an optional time-to-live for each entry"""
+    def __init__(self, max_size: int = DEFAULT_CACHE_SIZE, ttl: float = DEFAULT_CACHE_TTL):
+        self.max_size, self.ttl = max_size, ttl
+        self._entries = OrderedDict()  # key -> (expiry_time, value)
+        self.hits, self.misses, self.evictions = 0, 0, 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and self.ttl>0 and entry[0]<time.monotonic():
+            del self._entries[key]  # Expired
+            self.evictions += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, value):
+        if self.max_size<=0:
+            return
+        self._entries[key] = (time.monotonic()+self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries)>self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        return dict(
+            size=len(self._entries), max_size=self.max_size, ttl=self.ttl,
+            hits=self.hits, misses=self.misses, evictions=self.evictions,
+        )
+
+
+# The dictionary used by each worker process : the workers are spawned (forking the multi-threaded
+#   server could deadlock them), and each one loads the dictionary with the worker_loader it is
+#   given.  The phrase index is memory-mapped, so they all share one page-cache copy of it, and
+#   the queries are embedded in the parent (so the workers don't each need the embedding model)
+_worker_dictionary = None
+
+def _init_worker(worker_loader):
+    global _worker_dictionary
+    _worker_dictionary = worker_loader()
+
+def _find_anagrams(letters, pattern, definition, definition_vector):
+    return _worker_dictionary.find_anagrams(letters, pattern=pattern, definition=definition,
+                                            definition_vector=definition_vector)
+
+def _find_nearest_words_batch(queries, query_vectors):
+    return _worker_dictionary.find_nearest_words_batch(queries, query_vectors=query_vectors)
+
+
+def find_nearest_words_batch(crossword_dictionary, queries):
+    """Searches a list of (definition, k, pattern, substrings) queries, together if the dictionary supports it"""
+    if hasattr(crossword_dictionary, "find_nearest_words_batch"):
+        return crossword_dictionary.find_nearest_words_batch(queries)
+    return [ crossword_dictionary.find_nearest_words(definition, k=k, pattern=pattern, substrings=substrings)
+             for definition, k, pattern, substrings in queries ]
+
+
+class DictionarySearch:
+    """Runs crossword_dictionary.find_nearest_words in a worker pool, off the event loop.
+
+    pool is either "thread" (shares the dictionary directly) or "process" (spawned workers, 
+    each loading the dictionary by calling worker_loader, which must be picklable).  The 
+    process workers are sent the queries' vectors, embedded with crossword_dictionary.embedder.
+
+    Queries arriving within batch_wait seconds of each other (from any of the 
+    conversations) are searched together, in batches of up to batch_size.
+    """
+    def __init__(self, crossword_dictionary, pool: str = DEFAULT_SEARCH_POOL, max_workers: int = DEFAULT_SEARCH_WORKERS,
+                 cache_size: int = DEFAULT_CACHE_SIZE, cache_ttl: float = DEFAULT_CACHE_TTL,
+                 batch_size: int = DEFAULT_BATCH_SIZE, batch_wait: float = DEFAULT_BATCH_WAIT, worker_loader=None):
+        self.crossword_dictionary = crossword_dictionary
+        self.worker_loader = worker_loader
+        self._executor = None
+        self.configure(pool=pool, max_workers=max_workers, cache_size=cache_size, cache_ttl=cache_ttl,
+                       batch_size=batch_size, batch_wait=batch_wait)
+
+    def configure(self, pool: str = DEFAULT_SEARCH_POOL, max_workers: int = DEFAULT_SEARCH_WORKERS,
+                  cache_size: int = DEFAULT_CACHE_SIZE, cache_ttl: float = DEFAULT_CACHE_TTL,
+                  batch_size: int = DEFAULT_BATCH_SIZE, batch_wait: float = DEFAULT_BATCH_WAIT):
+        if pool not in SEARCH_POOL_TYPES:
+            raise ValueError(f"pool must be one of {SEARCH_POOL_TYPES}, not {pool!r}")
+        if max_workers<1:
+            raise ValueError(f"max_workers must be a positive integer")
+        if batch_size<1:
+            raise ValueError(f"batch_size must be a positive integer")
+        if batch_wait<0:
+            raise ValueError(f"batch_wait must not be negative")
+        if pool=="process" and self.worker_loader is None:
+            raise ValueError(f"the process pool needs a worker_loader (to load the dictionary in each worker)")
+        self.shutdown()
+        self.pool, self.max_workers = pool, max_workers
+        self.cache = LRUCache(max_size=cache_size, ttl=cache_ttl)
+        self.batch_size, self.batch_wait = batch_size, batch_wait
+        self._pending = []  # (query, future) waiting for the next batch
+        self._flush_handle = None
+        self._batch_tasks = set()  # Batches being searched (references kept until they are done)
+        self.batch_sizes = Counter()  # batch size -> number of batches searched
+
+        if pool == "process":
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker, initargs=(self.worker_loader,))
+        else:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="dictionary_search")
+        logger.info(f"dictionary_search running in a {pool} pool with {max_workers} workers")
+
+    async def find_nearest_words(self, definition, k=10, pattern=None, substrings=None):
+        # The normalized query is also what gets searched, so cached results are identical to fresh ones
+        definition, pattern, substrings = normalize_query(definition, pattern, substrings)
+        key = (definition, pattern, substrings, k)
+        matches = self.cache.get(key)
+        if matches is not None:
+            SEARCH_CACHE.inc(result="hit")
+            return matches
+        SEARCH_CACHE.inc(result="miss")
+
+        loop = asyncio.get_running_loop()
+        with SEARCH_SECONDS.time():
+            if self.batch_size>1:
+                matches = await self.search_batched((definition, k, pattern, list(substrings)))
+            elif self.pool == "process":
+                query = (definition, k, pattern, list(substrings))
+                matches = (await loop.run_in_executor(
+                    self._executor, _find_nearest_words_batch, [query], await self.embed([definition])))[0]
+            else:
+                matches = await loop.run_in_executor(
+                    self._executor, lambda: self.crossword_dictionary.find_nearest_words(
+                        definition, k=k, pattern=pattern, substrings=list(substrings)))
+        self.cache.put(key, matches)
+        return matches
+
+    async def find_anagrams(self, letters, pattern=None, definition=None):
+        # Anagrams only depend on the multiset of letters, so that's what gets searched (and cached)
+        letters = anagram_signature(phrase_letters(letters))
+        pattern = canonical_pattern(pattern)
+        definition = ' '.join(definition.lower().split()) if definition else None
+        key = ("anagrams", letters, pattern, definition)
+        matches = self.cache.get(key)
+        if matches is not None:
+            SEARCH_CACHE.inc(result="hit")
+            return matches
+        SEARCH_CACHE.inc(result="miss")
+
+        loop = asyncio.get_running_loop()
+        with SEARCH_SECONDS.time():
+            if self.pool == "process":
+                definition_vector = (await self.embed([definition]))[0] if definition else None
+                matches = await loop.run_in_executor(
+                    self._executor, _find_anagrams, letters, pattern, definition, definition_vector)
+            else:
+                matches = await loop.run_in_executor(
+                    self._executor, lambda: self.crossword_dictionary.find_anagrams(
+                        letters, pattern=pattern, definition=definition))
+        self.cache.put(key, matches)
+        return matches
+
+    async def embed(self, phrases):
+        """The query vectors sent to the process workers (embedded in a thread, off the event loop)"""
+        return await asyncio.to_thread(self.crossword_dictionary.embedder.embed, phrases)
+
+    async def search_batched(self, query):
+        """Queue query for the next batch, which is searched when full (or after batch_wait)"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query, future))
+        if len(self._pending)>=self.batch_size:
+            self.flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_wait, self.flush)
+        return await future
+
+    def flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        self.batch_sizes[len(batch)] += 1
+        SEARCH_BATCH_SIZE.observe(len(batch))
+        task = asyncio.create_task(self.search_batch(batch))
+        self._batch_tasks.add(task)
+        task.add_done_callback(self._batch_tasks.discard)
+
+    async def search_batch(self, batch):
+        queries = [ query for query, _ in batch ]
+        loop = asyncio.get_running_loop()
+        try:
+            if self.pool == "process":
+                query_vectors = await self.embed([ definition for definition, *_ in queries ])
+                results = await loop.run_in_executor(self._executor, _find_nearest_words_batch, queries, query_vectors)
+            else:
+                results = await loop.run_in_executor(
+                    self._executor, find_nearest_words_batch, self.crossword_dictionary, queries)
+        except Exception as e:
+            results = [e]*len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done():  # The waiting search was cancelled
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def cache_stats(self):
+        return self.cache.stats()
+
+    def batch_stats(self):
+        """The batching settings, and a histogram of the batch sizes actually searched"""
+        return dict(
+            batch_size=self.batch_size, batch_wait=self.batch_wait,
+            batches=sum(self.batch_sizes.values()), queries=sum(n*count for n, count in self.batch_sizes.items()),
+            histogram=dict(sorted(self.batch_sizes.items())),
+        )
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -1,3 +1,6 @@
+import time
+from collections import OrderedDict
+
 from a2a.server.agent_execution import AgentExecutor, RequestContext
 from a2a.server.events import EventQueue
 from a2a.server.tasks import TaskUpdater
@@ -13,7 +16,10 @@ from a2a.utils import (
     new_task,
 )
 
-from agent import Agent
+from agent import Agent, DICTIONARY_READY_TIMEOUT
+
+import logging
+logger = logging.getLogger("crypticreasoner_setter")
 
 
 TERMINAL_STATES = {
@@ -23,10 +29,60 @@ TERMINAL_STATES = {
     TaskState.rejected
 }
 
+DEFAULT_MAX_AGENTS = 100  # Maximum number of live Agent instances
+DEFAULT_AGENT_IDLE_TTL = 3600  # seconds before an idle Agent is evicted
+
 
 class Executor(AgentExecutor):
-    def __init__(self):
-        self.agents: dict[str, Agent] = {} # context_id to agent instance
+    def __init__(self, dictionary_ready_timeout=DICTIONARY_READY_TIMEOUT,
+                 max_agents=DEFAULT_MAX_AGENTS, agent_idle_ttl=DEFAULT_AGENT_IDLE_TTL,
+                 checkpoint_store=None, transcript_store=None):
+        self.agents: OrderedDict[str, Agent] = OrderedDict() # context_id to agent instance (least recently used first)
+        self.dictionary_ready_timeout = dictionary_ready_timeout
+        self.max_agents, self.agent_idle_ttl = max_agents, agent_idle_ttl
+        self.checkpoint_store, self.transcript_store = checkpoint_store, transcript_store
+        self._last_used: dict[str, float] = {} # context_id to time.monotonic() of last use
+        self._running: set[str] = set() # context_ids with a task in progress (never evicted)
+        self.counters = dict(created=0, released=0, evicted_idle=0, evicted_lru=0)
+
+    def stats(self):
+        return dict(live=len(self.agents), running=len(self._running), **self.counters)
+
+    def release_agent(self, context_id, reason="released"):
+        if self.agents.pop(context_id, None) is not None:
+            self._last_used.pop(context_id, None)
+            self.counters[reason] += 1
+
+    def evict_agents(self):
+        """Release idle agents past their TTL, then the least recently used idle ones beyond max_agents
+
+        Agents are released as soon as their task reaches a terminal state, so the only idle 
+        ones are those whose execute() ended without one : i.e. it was cancelled (e.g. the 
+        client disconnected partway through an evaluation).  This stops those accumulating.
+        """
+        now = time.monotonic()
+        idle = [ context_id for context_id in self.agents if context_id not in self._running ]
+        for context_id in idle:
+            if now-self._last_used.get(context_id, now)>self.agent_idle_ttl:
+                self.release_agent(context_id, reason="evicted_idle")
+        for context_id in idle:
+            if len(self.agents)<self.max_agents:
+                break
+            self.release_agent(context_id, reason="evicted_lru")
+
+    def get_agent(self, context_id):
+        agent = self.agents.get(context_id)
+        if not agent:
+            self.evict_agents()
+            if len(self.agents)>=self.max_agents:
+                raise ServerError(error=InvalidRequestError(message=f"Too many evaluations in progress (max_agents={self.max_agents})"))
+            agent = Agent(dictionary_ready_timeout=self.dictionary_ready_timeout,
+                          checkpoint_store=self.checkpoint_store, transcript_store=self.transcript_store)
+            self.agents[context_id] = agent
+            self.counters["created"] += 1
+        self.agents.move_to_end(context_id)
+        self._last_used[context_id] = time.monotonic()
+        return agent
 
     async def execute(self, context: RequestContext, event_queue: EventQueue) -> None:
         msg = context.message
@@ -37,18 +93,19 @@ class Executor(AgentExecutor):
         if task and task.status.state in TERMINAL_STATES:
             raise ServerError(error=InvalidRequestError(message=f"Task {task.id} already processed (state: {task.status.state})"))
 
-        if not task:
+        is_new_task = not task
+        if is_new_task:
             task = new_task(msg)
-            await event_queue.enqueue_event(task)
 
+        # Checked before a new task is enqueued, so a request over max_agents doesn't leave it 'submitted' forever
         context_id = task.context_id
-        agent = self.agents.get(context_id)
-        if not agent:
-            agent = Agent()
-            self.agents[context_id] = agent
+        agent = self.get_agent(context_id)
+        if is_new_task:
+            await event_queue.enqueue_event(task)
 
         updater = TaskUpdater(event_queue, task.id, context_id)
 
+        self._running.add(context_id)
         await updater.start_work()
         try:
             await agent.run(msg, updater)
@@ -57,6 +114,13 @@ class Executor(AgentExecutor):
         except Exception as e:
             print(f"Task failed with agent error: {e}")
             await updater.failed(new_agent_text_message(f"Agent error: {e}", context_id=context_id, task_id=task.id))
+        finally:
+            self._running.discard(context_id)
+            if updater._terminal_state_reached:
+                self.release_agent(context_id)  # The task is over : don't hold on to its dataset, messenger, etc
+            else:
+                self._last_used[context_id] = time.monotonic()
+            logger.info(f"Executor agents : {self.stats()}")
 
     async def cancel(self, context: RequestContext, event_queue: EventQueue) -> None:
         raise ServerError(error=UnsupportedOperationError())
@@ -0,0 +1,96 @@
+import re, time
+import argparse
+import asyncio
+import json
+
+import httpx
+import numpy as np
+
+from a2a.types import DataPart
+from messenger import client_pool, create_message
+
+# Fire many concurrent EvalRequests at the green agent (server.py), with purple_agent_stub.py as the solver
+#   e.g. : uv run src/purple_agent_stub.py --policy search --latency 0.2 &
+#          uv run src/server.py &
+#          uv run src/load-test.py --requests 50 --concurrency 20
+
+parser = argparse.ArgumentParser(description="Load-test the green agent with concurrent evaluation requests.")
+parser.add_argument("--green-url", type=str, default="http://127.0.0.1:9009", help="URL of the green agent (server.py)")
+parser.add_argument("--solver-url", type=str, default="http://127.0.0.1:9019", help="URL of the solver (purple_agent_stub.py)")
+parser.add_argument("--requests", type=int, default=20, help="Number of evaluation requests")
+parser.add_argument("--concurrency", type=int, default=10, help="Number of evaluation requests in flight at once")
+parser.add_argument("--num-tasks", type=int, default=5, help="Clues in each evaluation request")
+parser.add_argument("--split", type=str, default="val", help="Cryptonite split")
+parser.add_argument("--config", type=str, default="{}", help="JSON of any other config keys (e.g. max_concurrency)")
+parser.add_argument("--timeout", type=int, default=600, help="Seconds to wait for each evaluation")
+args = parser.parse_args()
+
+
+async def get_rss():
+    async with httpx.AsyncClient() as httpx_client:
+        metrics = (await httpx_client.get(f"{args.green_url.rstrip('/')}/metrics")).text
+    match = re.search(r'^process_resident_memory_bytes (\d+)', metrics, re.MULTILINE)
+    return int(match.group(1)) if match else None
+
+
+async def run_request(i, semaphore):
+    request = dict(
+        participants=dict(crypticreasoner_solver=args.solver_url),
+        config=dict(dataset="cryptonite", split=args.split, num_tasks=args.num_tasks, seed=i, resume=False,
+                    **json.loads(args.config)),
+    )
+    async with semaphore:
+        t0 = time.time()
+        client = await client_pool.get_client(args.green_url, timeout=args.timeout)
+        task = None
+        async for event in client.send_message(create_message(text=json.dumps(request))):
+            if isinstance(event, tuple):
+                task = event[0]
+        elapsed = time.time()-t0
+
+    # The final "Result" only has each task's score : the full results (with turn_seconds) are the "Task result"s
+    status = task.status.state.value if task else "no task"
+    artifacts = { name: [ part.root.data for artifact in (task.artifacts or []) if artifact.name==name
+                          for part in artifact.parts if isinstance(part.root, DataPart) ]
+                  for name in ["Result", "Task result"] } if task else dict()
+    if not artifacts.get("Result"):
+        return status, elapsed, None
+    return status, elapsed, dict(artifacts["Result"][0], results=artifacts["Task result"])
+
+
+def percentiles(values):
+    if not values:
+        return dict()
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return dict(p50=round(float(p50), 4), p95=round(float(p95), 4), p99=round(float(p99), 4), max=round(max(values), 4))
+
+
+async def main():
+    rss_start = await get_rss()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    t0 = time.time()
+    outcomes = await asyncio.gather(*[ run_request(i, semaphore) for i in range(args.requests) ],
+                                    return_exceptions=True)
+    wall = time.time()-t0
+    rss_end = await get_rss()
+    await client_pool.close()
+
+    failures = [ o for o in outcomes if isinstance(o, Exception) or o[2] is None ]
+    completed = [ o for o in outcomes if not isinstance(o, Exception) and o[2] is not None ]
+    results = [ result for _, _, data in completed for result in data["results"] ]
+    turn_seconds = [ t for result in results for t in result.get("turn_seconds", []) ]
+    for failure in failures[:5]:
+        print(f"Failed : {failure}")
+
+    print(json.dumps(dict(
+        requests=args.requests, concurrency=args.concurrency, completed=len(completed), failed=len(failures),
+        clues=len(results), turns=len(turn_seconds), wall_seconds=round(wall, 3),
+        clues_per_second=round(len(results)/wall, 3), turns_per_second=round(len(turn_seconds)/wall, 3),
+        request_seconds=percentiles([ elapsed for _, elapsed, _ in completed ]),
+        turn_seconds=percentiles(turn_seconds),
+        accuracy=round(sum(result["score"] for result in results)/len(results), 4) if results else 0.,
+        rss_start_mb=round(rss_start/2**20, 1) if rss_start else None,
+        rss_end_mb=round(rss_end/2**20, 1) if rss_end else None,
+    )))
+
+asyncio.run(main())
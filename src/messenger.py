@@ -1,4 +1,6 @@
 import json
+import time
+import asyncio
 from uuid import uuid4
 
 import httpx
@@ -16,8 +18,12 @@ from a2a.types import (
     DataPart,
 )
 
+from metrics import AGENT_REQUEST_SECONDS, AGENT_REQUEST_ERRORS
+
 
 DEFAULT_TIMEOUT = 300
+DEFAULT_CLIENT_TTL = 600  # seconds before a cached agent card / A2A client is re-resolved
+DEFAULT_MAX_CONNECTIONS = 100
 
 
 def create_message(
@@ -42,6 +48,81 @@ def merge_parts(parts: list[Part]) -> str:
     return "\n".join(chunks)
 
 
+class ClientPool:
+    """Long-lived, connection-pooled httpx clients - one per agent URL.
+
+    The resolved agent card and the A2A client built from it are cached
+    for `ttl` seconds, so that each turn of a conversation only pays for
+    the request itself (not TCP/TLS setup, nor an agent card fetch).
+    """
+    def __init__(self, ttl: float = DEFAULT_CLIENT_TTL, max_connections: int = DEFAULT_MAX_CONNECTIONS):
+        self.ttl = ttl
+        self.max_connections = max_connections
+        self._httpx_clients = {}  # (base_url, timeout) -> httpx.AsyncClient
+        self._clients = {}  # (base_url, streaming, timeout) -> (expiry_time, agent_card, client)
+        self._lock = asyncio.Lock()
+
+    def get_httpx_client(self, base_url: str, timeout: int = DEFAULT_TIMEOUT) -> httpx.AsyncClient:
+        key = (base_url, timeout)
+        httpx_client = self._httpx_clients.get(key)
+        if httpx_client is None or httpx_client.is_closed:
+            httpx_client = httpx.AsyncClient(
+                timeout=timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+            self._httpx_clients[key] = httpx_client
+        return httpx_client
+
+    async def get_client(self, base_url: str, streaming: bool = False, timeout: int = DEFAULT_TIMEOUT):
+        """Returns a (cached) A2A client for base_url"""
+        key = (base_url, streaming, timeout)
+        cached = self._clients.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[2]
+        async with self._lock:
+            cached = self._clients.get(key)  # Another coroutine may have just refreshed this
+            if cached is not None and cached[0] > time.monotonic():
+                return cached[2]
+            httpx_client = self.get_httpx_client(base_url, timeout)
+            resolver = A2ACardResolver(httpx_client=httpx_client, base_url=base_url)
+            agent_card = await resolver.get_agent_card()
+            client = create_client(httpx_client, agent_card, streaming=streaming)
+            self._clients[key] = (time.monotonic()+self.ttl, agent_card, client)
+            return client
+
+    async def get_agent_card(self, base_url: str, streaming: bool = False, timeout: int = DEFAULT_TIMEOUT):
+        await self.get_client(base_url, streaming=streaming, timeout=timeout)
+        return self._clients[(base_url, streaming, timeout)][1]
+
+    def invalidate(self, base_url: str):
+        """Forget the cached agent card(s) and A2A client(s) for base_url (the connections are kept)"""
+        for key in [ key for key in self._clients if key[0]==base_url ]:
+            del self._clients[key]
+
+    async def close(self):
+        """Close all the pooled connections"""
+        self._clients = {}
+        httpx_clients, self._httpx_clients = self._httpx_clients, {}
+        for httpx_client in httpx_clients.values():
+            await httpx_client.aclose()
+
+
+# Shared by all Messenger instances (unless they are given their own pool)
+client_pool = ClientPool()
+
+
+def create_client(httpx_client: httpx.AsyncClient, agent_card, streaming: bool = False, consumer: Consumer | None = None):
+    config = ClientConfig(
+        httpx_client=httpx_client,
+        streaming=streaming,
+    )
+    factory = ClientFactory(config)
+    return factory.create(agent_card, consumers=[consumer] if consumer else None)
+
+
 async def send_message(
     message: str,
     base_url: str,
@@ -49,52 +130,74 @@ async def send_message(
     streaming: bool = False,
     timeout: int = DEFAULT_TIMEOUT,
     consumer: Consumer | None = None,
+    pool: ClientPool | None = None,
+    on_text=None,
 ):
-    """Returns dict with context_id, response and status (if exists)"""
-    async with httpx.AsyncClient(timeout=timeout) as httpx_client:
-        resolver = A2ACardResolver(httpx_client=httpx_client, base_url=base_url)
-        agent_card = await resolver.get_agent_card()
-        config = ClientConfig(
-            httpx_client=httpx_client,
-            streaming=streaming,
-        )
-        factory = ClientFactory(config)
-        client = factory.create(agent_card)
-        if consumer:
-            await client.add_event_consumer(consumer)
-
-        outbound_msg = create_message(text=message, context_id=context_id)
-        last_event = None
-        outputs = {"response": "", "context_id": None}
-
-        # if streaming == False, only one event is generated
-        async for event in client.send_message(outbound_msg):
-            last_event = event
-
-        match last_event:
-            case Message() as msg:
-                outputs["context_id"] = msg.context_id
+    """Returns dict with context_id, response and status (if exists)
+
+    If pool is given, its long-lived connection and cached agent card are used,
+    otherwise a one-off connection is set up (and torn down) for this message.
+    When streaming, on_text (if given) is called with the response so far as it arrives.
+    """
+    if pool is None:
+        async with httpx.AsyncClient(timeout=timeout) as httpx_client:
+            resolver = A2ACardResolver(httpx_client=httpx_client, base_url=base_url)
+            agent_card = await resolver.get_agent_card()
+            client = create_client(httpx_client, agent_card, streaming=streaming, consumer=consumer)
+            return await send_message_with_client(client, message, context_id=context_id, on_text=on_text)
+
+    if consumer:  # Consumers are attached to the client, so don't add them to the shared one
+        agent_card = await pool.get_agent_card(base_url, streaming=streaming, timeout=timeout)
+        client = create_client(pool.get_httpx_client(base_url, timeout), agent_card,
+                               streaming=streaming, consumer=consumer)
+    else:
+        client = await pool.get_client(base_url, streaming=streaming, timeout=timeout)
+    return await send_message_with_client(client, message, context_id=context_id, on_text=on_text)
+
+
+async def send_message_with_client(client, message: str, context_id: str | None = None, on_text=None):
+    """If on_text is given, it is called with the response so far as each (streamed) event arrives"""
+    outbound_msg = create_message(text=message, context_id=context_id)
+    outputs = {"response": "", "context_id": None}
+
+    # if streaming == False, only one event is generated
+    async for event in client.send_message(outbound_msg):
+        outputs = event_outputs(event)
+        if on_text is not None:
+            on_text(outputs["response"])
+
+    return outputs
+
+
+def event_outputs(event):
+    """The context_id, response and status (if exists) so far, from a client event"""
+    outputs = {"response": "", "context_id": None}
+    match event:
+        case Message() as msg:
+            outputs["context_id"] = msg.context_id
+            outputs["response"] += merge_parts(msg.parts)
+
+        case (task, update):
+            outputs["context_id"] = task.context_id
+            outputs["status"] = task.status.state.value
+            msg = task.status.message
+            if msg:
                 outputs["response"] += merge_parts(msg.parts)
+            if task.artifacts:
+                for artifact in task.artifacts:
+                    outputs["response"] += merge_parts(artifact.parts)
 
-            case (task, update):
-                outputs["context_id"] = task.context_id
-                outputs["status"] = task.status.state.value
-                msg = task.status.message
-                if msg:
-                    outputs["response"] += merge_parts(msg.parts)
-                if task.artifacts:
-                    for artifact in task.artifacts:
-                        outputs["response"] += merge_parts(artifact.parts)
-
-            case _:
-                pass
+        case _:
+            pass
 
-        return outputs
+    return outputs
 
 
 class Messenger:
-    def __init__(self):
+    def __init__(self, pool: ClientPool | None = None, streaming: bool = False):
         self._context_ids = {}
+        self._pool = pool or client_pool
+        self.streaming = streaming  # Read the response events as they arrive (if the agent supports it)
 
     async def talk_to_agent(
         self,
@@ -102,6 +205,7 @@ class Messenger:
         url: str,
         new_conversation: bool = False,
         timeout: int = DEFAULT_TIMEOUT,
+        on_text=None,
     ):
         """
         Communicate with another agent by sending a message and receiving their response.
@@ -111,16 +215,26 @@ class Messenger:
             url: The agent's URL endpoint
             new_conversation: If True, start fresh conversation; if False, continue existing conversation
             timeout: Timeout in seconds for the request (default: 300)
+            on_text: When streaming, called with the response so far each time more of it arrives
 
         Returns:
             str: The agent's response message
         """
-        outputs = await send_message(
-            message=message,
-            base_url=url,
-            context_id=None if new_conversation else self._context_ids.get(url, None),
-            timeout=timeout,
-        )
+        try:
+            with AGENT_REQUEST_SECONDS.time():
+                outputs = await send_message(
+                    message=message,
+                    base_url=url,
+                    context_id=None if new_conversation else self._context_ids.get(url, None),
+                    timeout=timeout,
+                    pool=self._pool,
+                    streaming=self.streaming,
+                    on_text=on_text,
+                )
+        except Exception:
+            AGENT_REQUEST_ERRORS.inc()
+            self._pool.invalidate(url)  # The agent may have moved : re-resolve its card next time
+            raise
         if outputs.get("status", "completed") != "completed":
             raise RuntimeError(f"{url} responded with: {outputs}")
         self._context_ids[url] = outputs.get("context_id", None)
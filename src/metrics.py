@@ -0,0 +1,125 @@
+import os, time
+import threading
+import contextlib
+
+# Hot-path timings and counts, exported in the Prometheus text format by server.py's /metrics route
+#   (a small self-contained registry : no prometheus_client dependency is needed for this)
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10., 30., 60., 120., 300.)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 20, 30, 50)
+
+REGISTRY = []  # Metrics are rendered in the order they are defined
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{"+",".join(f'{name}="{value}"' for name, value in labels)+"}"
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=(), registry=REGISTRY):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = dict()  # label values -> count
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0)+amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{format_labels(zip(self.labelnames, key))} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=SECONDS_BUCKETS, registry=REGISTRY):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = dict()  # label values -> ([count for each bucket], sum, count)
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            bucket_counts, total, count = self._values.get(key, ([0]*len(self.buckets), 0., 0))
+            for i, bound in enumerate(self.buckets):
+                if value<=bound:
+                    bucket_counts[i] += 1
+                    break
+            self._values[key] = (bucket_counts, total+value, count+1)
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observes the duration (in seconds) of the with block"""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter()-t0, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (bucket_counts, total, count) in sorted(self._values.items()):
+                labels = list(zip(self.labelnames, key))
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{format_labels(labels+[('le', bound)])} {cumulative}")
+                lines.append(f"{self.name}_bucket{format_labels(labels+[('le', '+Inf')])} {count}")
+                lines.append(f"{self.name}_sum{format_labels(labels)} {total}")
+                lines.append(f"{self.name}_count{format_labels(labels)} {count}")
+        return lines
+
+
+class Gauge:
+    """A value read (from get_value) whenever the metrics are rendered"""
+    def __init__(self, name, help, get_value, registry=REGISTRY):
+        self.name, self.help, self.get_value = name, help, get_value
+        registry.append(self)
+
+    def render(self):
+        value = self.get_value()
+        if value is None:
+            return []
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {value}"]
+
+
+def resident_memory_bytes():
+    try:
+        with open("/proc/self/statm", 'rt') as f:  # Linux
+            return int(f.read().split()[1])*os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def render_metrics(registry=REGISTRY):
+    return "\n".join(line for metric in registry for line in metric.render())+"\n"
+
+
+# run_single_task : where each clue's time goes
+TASK_PHASE_SECONDS = Histogram("crypticreasoner_task_phase_seconds",
+    "Time spent in each phase of a clue's turns (solver, parse, search, status)", labelnames=["phase"])
+TASK_SECONDS = Histogram("crypticreasoner_task_seconds", "Time taken to evaluate each clue")
+TASK_TURNS = Histogram("crypticreasoner_task_turns", "Solver round-trips for each clue", buckets=COUNT_BUCKETS)
+TASK_TOOL_CALLS = Histogram("crypticreasoner_task_tool_calls", "dictionary_search calls for each clue", buckets=COUNT_BUCKETS)
+
+# Messenger.talk_to_agent
+AGENT_REQUEST_SECONDS = Histogram("crypticreasoner_agent_request_seconds", "Time taken by each message to a participant agent")
+AGENT_REQUEST_ERRORS = Counter("crypticreasoner_agent_request_errors_total", "Failed messages to participant agents")
+
+# DictionarySearch.find_nearest_words
+SEARCH_SECONDS = Histogram("crypticreasoner_dictionary_search_seconds",
+    "Time taken by each dictionary_search (including any wait for its batch)")
+SEARCH_CACHE = Counter("crypticreasoner_dictionary_search_cache_total", "dictionary_search cache lookups", labelnames=["result"])
+SEARCH_BATCH_SIZE = Histogram("crypticreasoner_dictionary_search_batch_size",
+    "Number of queries in each dictionary_search batch", buckets=(1, 2, 4, 8, 16, 32, 64))
+
+PROCESS_RSS = Gauge("process_resident_memory_bytes", "Resident memory size in bytes", resident_memory_bytes)
@@ -0,0 +1,693 @@
+import os, re, time
+import json
+import hashlib
+import unicodedata
+
+import numpy as np
+
+import logging
+logger = logging.getLogger("crypticreasoner_setter")
+
+
+# Bump this whenever the on-disk layout changes : load_phrase_index() refuses other versions
+INDEX_FORMAT_VERSION = 7
+
+# Files within an index directory
+META_FILE = "meta.json"
+VECTORS_FILE = "vectors.npy"  # float32 (count, dim), each row L2-normalized
+VECTORS_F16_FILE = "vectors_f16.npy"  # float16 copy of the vectors
+VECTORS_I8_FILE = "vectors_i8.npy"  # int8 copy of the vectors : row i is ~ vectors_i8[i]*vector_scales[i]
+VECTOR_SCALES_FILE = "vector_scales.npy"  # float32 (count,) per-row scale factors for vectors_i8
+PHRASES_FILE = "phrases.bin"  # utf-8 phrases, concatenated
+PHRASE_OFFSETS_FILE = "phrase_offsets.npy"  # int64 (count+1) : phrase i is phrases[offsets[i]:offsets[i+1]]
+BUCKETS_FILE = "buckets.json"  # enumeration -> [start, end) : the rows with that enumeration are contiguous
+NGRAM_OFFSETS_FILE = "ngram_offsets.npy"  # int64 (N_NGRAM_CODES+1) : start of each ngram's posting list
+NGRAM_ROWS_FILE = "ngram_rows.npy"  # int32 : posting lists (each sorted by row) of rows containing each ngram
+IVF_CENTROIDS_FILE = "ivf_centroids.npy"  # float32 (n_lists, dim) : k-means centroids of the vectors
+IVF_OFFSETS_FILE = "ivf_offsets.npy"  # int64 (n_lists+1) : start of each centroid's list of rows
+IVF_ROWS_FILE = "ivf_rows.npy"  # int32 : rows assigned to each centroid
+ANAGRAM_OFFSETS_FILE = "anagram_offsets.npy"  # int64 (n_anagram_buckets+1) : start of each hash bucket's rows
+ANAGRAM_ROWS_FILE = "anagram_rows.npy"  # int32 : rows grouped by the hash bucket of their sorted letters
+ANAGRAM_HASHES_FILE = "anagram_hashes.npy"  # uint64 : the full hash of each of those rows' sorted letters
+POSITION_RANGES_FILE = "position_ranges.npy"  # int64 (max_letters+1, 3) : (start, end, offset) for each total length
+POSITION_BITS_FILE = "position_bits.npy"  # uint64 : bitsets of the rows with each letter at each position
+
+# Substrings are looked up via the posting lists of their 1-, 2- or 3-letter ngrams
+MAX_NGRAM = 3
+NGRAM_CODE_BASE = {1: 0, 2: 26, 3: 26+26**2}
+N_NGRAM_CODES = 26+26**2+26**3
+
+# Unconstrained searches can use an IVF (inverted file) index instead of an exact scan
+SEARCH_MODES = ["exact", "ivf"]
+DEFAULT_SEARCH_MODE = "exact"  # The reference mode
+DEFAULT_ANN_LISTS = 1024  # Number of k-means centroids (built offline)
+DEFAULT_ANN_NPROBE = 32  # Number of centroids' lists scanned per query (more = better recall, but slower)
+
+# The scan can run over a compact copy of the vectors, with the best candidates re-ranked in full precision
+PRECISIONS = ["float32", "float16", "int8"]
+DEFAULT_PRECISION = "float32"
+DEFAULT_RERANK_DEPTH = 100  # Number of candidates from a compact scan that are re-scored in float32
+SCAN_CHUNK_SIZE = 8192  # Rows converted to float32 at a time in a compact scan (keeps the working set in cache)
+
+
+def phrase_letters(phrase):
+    """Just the letters of a phrase, upper-cased (accents removed) : eg: "o'clock" -> 'OCLOCK'"""
+    phrase = unicodedata.normalize('NFKD', phrase)
+    return ''.join([a for a in phrase.upper() if 'A' <= a <= 'Z'])
+
+
+def phrase_words(phrase):
+    """The letters of each word of a phrase (split as in phrase_enumeration) : eg: "o'clock tower" -> ['OCLOCK', 'TOWER']"""
+    return [ letters for letters in map(phrase_letters, re.split(r"[ -]+", phrase)) if letters ]
+
+
+def canonical_enumeration(pattern):
+    """Standard notation for a pattern : eg: ' 3, 4 ' -> '(3,4)', '(5 - 3)' -> '(5-3)'
+
+    Returns None if there's no pattern (or it isn't just word lengths).
+    """
+    if pattern is None:
+        return None
+    pattern = re.sub(r'[\s()]', '', str(pattern))
+    if not re.fullmatch(r'\d+([,-]\d+)*', pattern):
+        return None
+    return f"({pattern})"
+
+
+def letter_pattern(pattern):
+    """The known letters of a pattern like '?L?D?E????' : eg: '?l?d? e-??' -> ('(5,1-2)', '?L?D?E??')
+
+    Unknown letters are '?' (or '.'), and words are separated by spaces (or commas) 
+    or hyphens, giving the enumeration.  The pattern can be in parentheses, or followed
+    by its enumeration : eg: '(?L?D?E????)' or '?L?D?E???? (10)'.
+    Returns None if pattern isn't a letter pattern.
+    """
+    if pattern is None:
+        return None
+    pattern = str(pattern).strip().upper().replace('.', '?')
+    given = re.fullmatch(r"(.*?)\s*(\([\d\s,-]+\))", pattern)
+    if given and given.group(1):
+        pattern, given = given.group(1), canonical_enumeration(given.group(2))
+    else:
+        given = None
+    pattern = re.sub(r"^\((.*)\)$", r"\1", pattern).strip()
+    if not re.fullmatch(r"[A-Z?]+(\s*[\s,-]\s*[A-Z?]+)*", pattern):
+        return None
+    words = re.findall(r"[A-Z?]+|-", pattern)
+    enumeration = ''.join([ '-' if word=='-' else ('' if i==0 or words[i-1]=='-' else ',')+str(len(word))
+                            for i, word in enumerate(words) ])
+    if given is not None and given!=f"({enumeration})":
+        return None  # The letters don't fit the enumeration given with them
+    return f"({enumeration})", ''.join([ word for word in words if word!='-' ])
+
+
+def canonical_pattern(pattern):
+    """Standard notation for an enumeration or a letter pattern : eg: '4' -> '(4)', 'b?r.' -> 'B?R?'
+
+    Returns None if there's no pattern (or it isn't either of these).
+    """
+    parsed = letter_pattern(pattern)
+    if parsed is None:
+        return canonical_enumeration(pattern)
+    enumeration, letters = parsed
+    words = []
+    for part in re.findall(r"\d+|[,-]", enumeration):
+        if part in ',-':
+            words.append(' ' if part==',' else '-')
+        else:
+            words.append(letters[:int(part)])
+            letters = letters[int(part):]
+    return ''.join(words)
+
+
+def phrase_enumeration(phrase):
+    """Standard notation for a dictionary phrase : eg: 'window ledge' -> '(6,5)', 'ice-cream' -> '(3-5)'"""
+    parts = []
+    for token in re.findall(r"[^ -]+|[ -]+", phrase):
+        if token[0] in ' -':
+            if parts and parts[-1] not in ',-':
+                parts.append('-' if '-' in token else ',')
+        else:
+            n_letters = len(phrase_letters(token))
+            if n_letters>0:  # eg: '&' doesn't count as a word
+                parts.append(str(n_letters))
+    if parts and parts[-1] in ',-':
+        parts.pop()
+    return f"({''.join(parts)})"
+
+
+def ngram_code(ngram):
+    """Position of an (upper-case) 1-, 2- or 3-letter ngram in the posting lists"""
+    code = 0
+    for a in ngram:
+        code = code*26 + (ord(a)-ord('A'))
+    return NGRAM_CODE_BASE[len(ngram)] + code
+
+
+def substring_ngram_codes(letters):
+    """Codes of the longest ngrams covering letters : a phrase containing letters must contain them all"""
+    n = min(len(letters), MAX_NGRAM)
+    return set([ ngram_code(letters[j:j+n]) for j in range(len(letters)-n+1) ])
+
+
+def phrase_ngram_codes(letters):
+    """Codes of every 1-, 2- and 3-letter ngram in letters"""
+    return set([ ngram_code(letters[j:j+n]) for n in range(1, MAX_NGRAM+1) for j in range(len(letters)-n+1) ])
+
+
+def anagram_signature(letters):
+    """Letters in sorted order : anagrams share the same signature, eg: 'SILENT' -> 'EILNST'"""
+    return ''.join(sorted(letters))
+
+
+def anagram_hash(letters):
+    """Stable (across processes) 64-bit hash of the anagram signature of letters"""
+    return int.from_bytes(hashlib.blake2b(anagram_signature(letters).encode('ascii'), digest_size=8).digest(), 'little')
+
+
+def build_anagram_index(phrases):
+    """Hash table of the phrases' anagram signatures : returns (offsets, rows, hashes)
+
+    There's a power-of-2 number of buckets (at least one per phrase), so a lookup 
+    only has to check the (usually zero or one) rows in its bucket.
+    """
+    hashes = np.array([ anagram_hash(phrase_letters(phrase)) for phrase in phrases ], dtype=np.uint64)
+    n_buckets = 1 << max(len(phrases)-1, 0).bit_length()
+    buckets = (hashes & np.uint64(n_buckets-1)).astype(np.int64)
+    rows = np.argsort(buckets, kind='stable').astype(np.int32)  # Within each bucket, rows stay sorted
+    offsets = np.zeros(n_buckets+1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(buckets, minlength=n_buckets))
+    return offsets, rows, hashes[rows]
+
+
+def build_position_index(phrases):
+    """Bitsets of the rows having each letter at each position : returns (ranges, bits)
+
+    The phrases must be ordered by total letters.  For each total length n, ranges[n] 
+    is (start, end, offset), and the rows in [start, end) having letter a at position p 
+    are the set bits of bits[offset+(p*26+a)*n_words:][:n_words], with n_words = ceil((end-start)/64).
+    """
+    letters = [ phrase_letters(phrase) for phrase in phrases ]
+    lengths = np.array([ len(l) for l in letters ], dtype=np.int64)
+    ranges = np.zeros((int(lengths.max(initial=0))+1, 3), dtype=np.int64)
+    blocks, offset = [], 0
+    for n in range(1, len(ranges)):
+        start, end = np.searchsorted(lengths, [n, n+1])
+        ranges[n] = start, end, offset
+        if end<=start:
+            continue
+        n_words = (end-start+63)//64
+        codes = np.frombuffer(''.join(letters[start:end]).encode('ascii'), dtype=np.uint8).reshape(end-start, n)
+        one_hot = (codes[:, :, None] == np.arange(ord('A'), ord('Z')+1, dtype=np.uint8))  # (rows, n, 26)
+        packed = np.packbits(one_hot, axis=0, bitorder='little')  # Bit j of each byte is row 8*byte+j
+        packed = np.pad(packed, [(0, n_words*8-len(packed)), (0, 0), (0, 0)])
+        blocks.append(np.ascontiguousarray(packed.transpose(1, 2, 0)).view(np.uint64).ravel())
+        offset += n*26*n_words
+    bits = np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.uint64)
+    return ranges, bits
+
+
+class PhraseEmbedder:
+    """fastText sentence vectors for (lower-cased) phrases, L2-normalized"""
+    def __init__(self, model_file="./src/cc.en.100.bin"):
+        import fasttext  # Only needed once we actually embed something
+        self.model = fasttext.load_model(model_file)
+        self.dim = self.model.get_dimension()
+
+    def embed(self, phrases):
+        vectors = np.zeros((len(phrases), self.dim), dtype=np.float32)
+        for i, phrase in enumerate(phrases):
+            vectors[i] = self.model.get_sentence_vector(' '.join(phrase.lower().split()))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-8)
+
+
+def read_dictionary_file(crossword_dictionary_file, strip_header=False):
+    """Unique phrases in the crossword dictionary (in file order)"""
+    with open(crossword_dictionary_file, 'rt', encoding='latin-1') as f:
+        lines = f.read().splitlines()
+    if strip_header:
+        lines = lines[lines.index('')+1:] if '' in lines else lines
+    phrases = [ line.strip() for line in lines ]
+    return list(dict.fromkeys([ phrase for phrase in phrases if len(phrase_letters(phrase))>0 ]))
+
+
+def train_ivf(vectors, n_lists=DEFAULT_ANN_LISTS, n_iterations=10, sample_size=65536, seed=42, chunk_size=16384):
+    """Spherical k-means over the (normalized) vectors : returns (centroids, offsets, rows) of the IVF lists"""
+    rng = np.random.default_rng(seed)
+    n_lists = max(1, min(n_lists, len(vectors)))
+    sample = vectors[np.sort(rng.choice(len(vectors), size=min(sample_size, len(vectors)), replace=False))]
+    centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+
+    def assign(x):
+        return np.concatenate([ np.argmax(x[i:i+chunk_size] @ centroids.T, axis=1)
+                                for i in range(0, len(x), chunk_size) ])
+
+    for _ in range(n_iterations):
+        assignment = assign(sample)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        empty = (norms[:, 0]==0)
+        centroids = sums / np.maximum(norms, 1e-8)
+        centroids[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]  # Restart empty clusters
+
+    assignment = assign(vectors)
+    rows = np.argsort(assignment, kind='stable').astype(np.int32)  # Within each list, rows stay sorted
+    offsets = np.zeros(n_lists+1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(assignment, minlength=n_lists))
+    return centroids.astype(np.float32), offsets, rows
+
+
+def build_phrase_index(embedder, crossword_dictionary_file, index_dir, strip_header=False, n_lists=DEFAULT_ANN_LISTS):
+    """Embed every phrase in the dictionary, and write the index files into index_dir
+
+    The rows are ordered by (total letters, enumeration), so that each enumeration 
+    (and each total length) is a contiguous slice of the index.
+    """
+    t0=time.time()
+    phrases = read_dictionary_file(crossword_dictionary_file, strip_header=strip_header)
+    enumerations = [ phrase_enumeration(phrase) for phrase in phrases ]
+    order = sorted(range(len(phrases)), key=lambda i: (len(phrase_letters(phrases[i])), enumerations[i], i))
+    phrases = [ phrases[i] for i in order ]
+    enumerations = [ enumerations[i] for i in order ]
+
+    buckets = dict()
+    for i, enumeration in enumerate(enumerations):
+        if enumeration not in buckets:
+            buckets[enumeration] = [i, i]
+        buckets[enumeration][1] = i+1
+
+    # Inverted index : for each ngram, the (sorted) rows whose letters contain it
+    ngram_codes, ngram_rows = [], []
+    for row, phrase in enumerate(phrases):
+        row_codes = phrase_ngram_codes(phrase_letters(phrase))
+        ngram_codes.extend(row_codes)
+        ngram_rows.extend([row]*len(row_codes))
+    ngram_codes = np.array(ngram_codes, dtype=np.int64)
+    ngram_rows = np.array(ngram_rows, dtype=np.int32)[np.lexsort((ngram_rows, ngram_codes))]
+    ngram_offsets = np.zeros(N_NGRAM_CODES+1, dtype=np.int64)
+    ngram_offsets[1:] = np.cumsum(np.bincount(ngram_codes, minlength=N_NGRAM_CODES))
+
+    anagram_offsets, anagram_rows, anagram_hashes = build_anagram_index(phrases)
+    position_ranges, position_bits = build_position_index(phrases)
+
+    vectors = embedder.embed(phrases)
+    logger.info(f"Embedded {len(phrases)} phrases in {(time.time()-t0):.2f}sec")
+
+    t0=time.time()
+    ivf_centroids, ivf_offsets, ivf_rows = train_ivf(vectors, n_lists=n_lists)
+    logger.info(f"Trained IVF index ({len(ivf_centroids)} lists) in {(time.time()-t0):.2f}sec")
+
+    phrase_bytes = [ phrase.encode('utf-8') for phrase in phrases ]
+    offsets = np.zeros(len(phrases)+1, dtype=np.int64)
+    offsets[1:] = np.cumsum([ len(b) for b in phrase_bytes ])
+
+    os.makedirs(index_dir, exist_ok=True)
+    np.save(os.path.join(index_dir, VECTORS_FILE), vectors.astype(np.float32))
+    np.save(os.path.join(index_dir, VECTORS_F16_FILE), vectors.astype(np.float16))
+    vector_scales = np.maximum(np.abs(vectors).max(axis=1), 1e-8) / 127.
+    np.save(os.path.join(index_dir, VECTORS_I8_FILE), np.round(vectors / vector_scales[:, None]).astype(np.int8))
+    np.save(os.path.join(index_dir, VECTOR_SCALES_FILE), vector_scales.astype(np.float32))
+    np.save(os.path.join(index_dir, PHRASE_OFFSETS_FILE), offsets)
+    np.save(os.path.join(index_dir, NGRAM_OFFSETS_FILE), ngram_offsets)
+    np.save(os.path.join(index_dir, NGRAM_ROWS_FILE), ngram_rows)
+    np.save(os.path.join(index_dir, IVF_CENTROIDS_FILE), ivf_centroids)
+    np.save(os.path.join(index_dir, IVF_OFFSETS_FILE), ivf_offsets)
+    np.save(os.path.join(index_dir, IVF_ROWS_FILE), ivf_rows)
+    np.save(os.path.join(index_dir, ANAGRAM_OFFSETS_FILE), anagram_offsets)
+    np.save(os.path.join(index_dir, ANAGRAM_ROWS_FILE), anagram_rows)
+    np.save(os.path.join(index_dir, ANAGRAM_HASHES_FILE), anagram_hashes)
+    np.save(os.path.join(index_dir, POSITION_RANGES_FILE), position_ranges)
+    np.save(os.path.join(index_dir, POSITION_BITS_FILE), position_bits)
+    with open(os.path.join(index_dir, PHRASES_FILE), 'wb') as f:
+        f.write(b''.join(phrase_bytes))
+    with open(os.path.join(index_dir, BUCKETS_FILE), 'wt') as f:
+        json.dump(buckets, f)
+
+    # Written last, so that a partially built index is never loaded
+    with open(os.path.join(index_dir, META_FILE), 'wt') as f:
+        json.dump(dict(
+            format_version=INDEX_FORMAT_VERSION,
+            count=len(phrases), dim=int(vectors.shape[1]),
+            dictionary_file=os.path.basename(crossword_dictionary_file),
+        ), f, indent=2)
+
+
+def load_phrase_index(index_dir, embedder):
+    """Memory-map a previously built index : all the processes using it share one page-cache copy"""
+    meta_file = os.path.join(index_dir, META_FILE)
+    if not os.path.isfile(meta_file):
+        raise FileNotFoundError(f"No phrase index at {index_dir} : build it with setup-build-index.py")
+    with open(meta_file, 'rt') as f:
+        meta = json.load(f)
+    if meta.get("format_version") != INDEX_FORMAT_VERSION:
+        raise ValueError(f"Phrase index at {index_dir} has format_version={meta.get('format_version')}, "
+                         f"expected {INDEX_FORMAT_VERSION} : rebuild it with setup-build-index.py")
+
+    vectors = np.load(os.path.join(index_dir, VECTORS_FILE), mmap_mode='r')
+    offsets = np.load(os.path.join(index_dir, PHRASE_OFFSETS_FILE), mmap_mode='r')
+    phrases = np.memmap(os.path.join(index_dir, PHRASES_FILE), dtype=np.uint8, mode='r')
+    with open(os.path.join(index_dir, BUCKETS_FILE), 'rt') as f:
+        buckets = { enumeration: tuple(bounds) for enumeration, bounds in json.load(f).items() }
+    ngram_offsets = np.load(os.path.join(index_dir, NGRAM_OFFSETS_FILE), mmap_mode='r')
+    ngram_rows = np.load(os.path.join(index_dir, NGRAM_ROWS_FILE), mmap_mode='r')
+    ivf = tuple([ np.load(os.path.join(index_dir, f), mmap_mode='r') 
+                  for f in [IVF_CENTROIDS_FILE, IVF_OFFSETS_FILE, IVF_ROWS_FILE] ])
+    compact_vectors = dict(
+        float16=(np.load(os.path.join(index_dir, VECTORS_F16_FILE), mmap_mode='r'), None),
+        int8=(np.load(os.path.join(index_dir, VECTORS_I8_FILE), mmap_mode='r'),
+              np.load(os.path.join(index_dir, VECTOR_SCALES_FILE), mmap_mode='r')),
+    )
+    anagrams = tuple([ np.load(os.path.join(index_dir, f), mmap_mode='r') 
+                       for f in [ANAGRAM_OFFSETS_FILE, ANAGRAM_ROWS_FILE, ANAGRAM_HASHES_FILE] ])
+    positions = (np.load(os.path.join(index_dir, POSITION_RANGES_FILE)),  # Small
+                 np.load(os.path.join(index_dir, POSITION_BITS_FILE), mmap_mode='r'))
+    return PhraseIndex(embedder, vectors, phrases, offsets, buckets, ngram_offsets, ngram_rows, ivf, meta,
+                       compact_vectors=compact_vectors, anagrams=anagrams, positions=positions)
+
+
+def load_worker_index(index_dir, index_config=None):
+    """A configured PhraseIndex, loaded in a dictionary_search worker process (see DictionarySearch)
+
+    It has no embedder : the parent process embeds the queries, and sends their vectors.
+    """
+    phrase_index = load_phrase_index(index_dir, None)
+    phrase_index.configure(**(index_config or {}))
+    return phrase_index
+
+
+class PhraseIndex:
+    """Embedding-based lookup over the crossword dictionary (a drop-in for CrosswordDictionary)"""
+    def __init__(self, embedder, vectors, phrases, offsets, buckets, ngram_offsets, ngram_rows, ivf, meta,
+                 compact_vectors=None, anagrams=None, positions=None):
+        self.embedder = embedder
+        self.vectors, self.phrases, self.offsets = vectors, phrases, offsets
+        self.buckets = buckets  # enumeration -> (start, end)
+        self.ngram_offsets, self.ngram_rows = ngram_offsets, ngram_rows
+        self.ivf_centroids, self.ivf_offsets, self.ivf_rows = ivf
+        self.anagram_offsets, self.anagram_rows, self.anagram_hashes = anagrams or (None, None, None)
+        self.position_ranges, self.position_bits = positions or (None, None)
+        self.compact_vectors = compact_vectors or dict()  # precision -> (vectors, per-row scales or None)
+        self.meta = meta
+        self.configure()
+
+    def configure(self, search_mode=DEFAULT_SEARCH_MODE, nprobe=DEFAULT_ANN_NPROBE, 
+                  precision=DEFAULT_PRECISION, rerank_depth=DEFAULT_RERANK_DEPTH):
+        """search_mode is used for unconstrained searches ('exact' is the reference)
+
+        With a compact precision, the scan uses float16 (or int8) vectors, and the top 
+        rerank_depth candidates are re-scored with the float32 vectors.
+        """
+        if search_mode not in SEARCH_MODES:
+            raise ValueError(f"search_mode must be one of {SEARCH_MODES}, not {search_mode!r}")
+        if nprobe<1:
+            raise ValueError(f"nprobe must be a positive integer")
+        if precision not in PRECISIONS or (precision!="float32" and precision not in self.compact_vectors):
+            raise ValueError(f"precision must be one of {['float32']+list(self.compact_vectors)}, not {precision!r}")
+        if rerank_depth<1:
+            raise ValueError(f"rerank_depth must be a positive integer")
+        self.search_mode, self.nprobe = search_mode, nprobe
+        self.precision, self.rerank_depth = precision, rerank_depth
+
+    def scan_scores(self, query, rows=None, start=0, end=None):
+        """Scores of the rows (or else the range [start, end)) using the configured precision
+
+        query can also be a (dim, n_queries) matrix, giving (n_rows, n_queries) scores.
+        """
+        if self.precision=="float32":
+            return (self.vectors[start:end] if rows is None else self.vectors[rows]) @ query
+        vectors, scales = self.compact_vectors[self.precision]
+        n = len(rows) if rows is not None else (len(self) if end is None else end)-start
+        scores = np.empty((n,)+query.shape[1:], dtype=np.float32)
+        for i in range(0, n, SCAN_CHUNK_SIZE):
+            chunk = rows[i:i+SCAN_CHUNK_SIZE] if rows is not None else slice(start+i, start+min(i+SCAN_CHUNK_SIZE, n))
+            scores[i:i+SCAN_CHUNK_SIZE] = np.asarray(vectors[chunk], dtype=np.float32) @ query
+            if scales is not None:
+                scores[i:i+SCAN_CHUNK_SIZE] *= scales[chunk].reshape((-1,)+(1,)*(query.ndim-1))
+        return scores
+
+    def __len__(self):
+        return len(self.offsets)-1
+
+    def get_phrase(self, i):
+        return bytes(self.phrases[self.offsets[i]:self.offsets[i+1]]).decode('utf-8')
+
+    def get_rows(self, enumeration=None):
+        """(start, end) of the rows having this enumeration (all the rows if enumeration is None)"""
+        if enumeration is None:
+            return 0, len(self)
+        return self.buckets.get(enumeration, (0, 0))
+
+    def get_pattern_rows(self, pattern):
+        """(start, end, rows) for a pattern : rows are those in [start, end) having a letter pattern's 
+        known letters (or None if there are none, so every row in [start, end) obeys the pattern)"""
+        parsed = letter_pattern(pattern)
+        if parsed is None:
+            return *self.get_rows(canonical_enumeration(pattern)), None
+        enumeration, letters = parsed
+        start, end = self.get_rows(enumeration)
+        known = [ (p, a) for p, a in enumerate(letters) if a!='?' ]
+        if not known or end<=start:
+            return start, end, None
+        return start, end, self.get_position_rows(len(letters), known, start, end)
+
+    def get_position_rows(self, n_letters, known, start, end):
+        """Rows in [start, end) (which all have n_letters letters) with each of the known (position, letter)s"""
+        lo, hi, offset = self.position_ranges[n_letters]
+        n_words = (hi-lo+63)//64
+        w0, w1 = (start-lo)//64, (end-lo+63)//64  # Only the words covering [start, end)
+        bits = None
+        for p, a in known:
+            base = offset + (p*26 + ord(a)-ord('A'))*n_words
+            if bits is None:
+                bits = np.array(self.position_bits[base+w0:base+w1])
+            else:
+                np.bitwise_and(bits, self.position_bits[base+w0:base+w1], out=bits)
+        rows = np.flatnonzero(np.unpackbits(bits.view(np.uint8), bitorder='little')) + lo + w0*64
+        return rows[(rows>=start) & (rows<end)]
+
+    def get_candidate_rows(self, substrings, start=0, end=None):
+        """Rows in [start, end) containing every ngram of the substrings (a superset of the rows containing the substrings)"""
+        end = len(self) if end is None else end
+        postings = []
+        for code in set().union(*[ substring_ngram_codes(s) for s in substrings ]):
+            rows = self.ngram_rows[self.ngram_offsets[code]:self.ngram_offsets[code+1]]
+            lo, hi = np.searchsorted(rows, [start, end])  # Posting lists are sorted by row
+            postings.append(rows[lo:hi])
+        postings.sort(key=len)  # Intersect the shortest lists first
+        candidates = np.asarray(postings[0])
+        for rows in postings[1:]:
+            if len(candidates)==0:
+                break
+            candidates = np.intersect1d(candidates, rows, assume_unique=True)
+        return candidates
+
+    def top_k_rows(self, query, k, rows=None, start=0, end=None):
+        """(rows, scores) of the k highest scoring rows (from rows, or else the range [start, end)), highest first"""
+        scores = self.scan_scores(query, rows=rows, start=start, end=end)
+        if rows is None:
+            rows = np.arange(start, len(self) if end is None else end)
+        return self.select_top_k(query, k, rows, scores)
+
+    def select_top_k(self, query, k, rows, scores):
+        """(rows, scores) of the k highest of the scanned scores, highest first"""
+        if self.precision!="float32":  # Re-rank the best candidates with the full precision vectors
+            depth = min(max(k, self.rerank_depth), len(scores))
+            shortlist = np.argpartition(-scores, depth-1)[:depth] if depth<len(scores) else np.arange(len(scores))
+            rows = rows[np.sort(shortlist)]
+            scores = self.vectors[rows] @ query
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k-1)[:k] if k<len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return rows[top], scores[top]
+
+    def ivf_candidate_rows(self, query, nprobe=None):
+        """Rows in the lists of the nprobe centroids closest to query"""
+        nprobe = min(nprobe or self.nprobe, len(self.ivf_centroids))
+        centroid_scores = self.ivf_centroids @ query
+        probes = np.argpartition(-centroid_scores, nprobe-1)[:nprobe]
+        return np.concatenate([ self.ivf_rows[self.ivf_offsets[c]:self.ivf_offsets[c+1]] for c in probes ])
+
+    def find_nearest_words(self, phrase, k=5, pattern=None, substrings=None):
+        """The k phrases closest to phrase, obeying the pattern and substrings constraints.
+
+        Returns a list of dict(phrase=..., score=...), highest score first.
+        """
+        return self.find_nearest_words_batch([(phrase, k, pattern, substrings)])[0]
+
+    def find_nearest_words_batch(self, queries, query_vectors=None):
+        """find_nearest_words for each of a list of (phrase, k, pattern, substrings) queries
+
+        The phrases are embedded together (unless their query_vectors are given), and the exact 
+        scans of queries with the same enumeration (and no substrings) are done as one matrix-matrix product.
+        """
+        if not queries:
+            return []
+        if query_vectors is None:
+            query_vectors = self.embedder.embed([ phrase for phrase, *_ in queries ])
+        results = [None]*len(queries)
+        scans = dict()  # (start, end) -> [the queries scanning those rows]
+        for i, (_, k, pattern, substrings) in enumerate(queries):
+            substrings = [ phrase_letters(s) for s in (substrings or []) ]
+            substrings = [ s for s in substrings if s ]
+
+            # Only the rows with the right enumeration (and any known letters) are scored
+            start, end, pattern_rows = self.get_pattern_rows(pattern)
+            if end<=start or (pattern_rows is not None and len(pattern_rows)==0):
+                results[i] = []
+            elif substrings:
+                results[i] = self.substring_matches(query_vectors[i], k, substrings, start, end, rows=pattern_rows)
+            elif pattern_rows is not None:
+                results[i] = self.get_matches(*self.top_k_rows(query_vectors[i], k, rows=pattern_rows))
+            else:
+                rows = None
+                if canonical_pattern(pattern) is None and self.search_mode=="ivf":
+                    rows = self.ivf_candidate_rows(query_vectors[i])
+                    if len(rows)<k:
+                        rows = None  # Not enough candidates : fall back to the exact scan
+                if rows is not None:
+                    results[i] = self.get_matches(*self.top_k_rows(query_vectors[i], k, rows=rows))
+                else:
+                    scans.setdefault((start, end), []).append(i)
+
+        for (start, end), batch in scans.items():
+            scores = self.scan_scores(query_vectors[batch].T, start=start, end=end)  # (rows, queries)
+            rows = np.arange(start, end)
+            for j, i in enumerate(batch):
+                results[i] = self.get_matches(*self.select_top_k(query_vectors[i], queries[i][1], rows, scores[:, j]))
+        return results
+
+    def find_anagrams(self, letters, pattern=None, definition=None, definition_vector=None):
+        """Every phrase that is an anagram of letters (and obeys the pattern).
+
+        Returns a list of dict(phrase=..., score=...) : ranked by similarity to definition 
+        (or its definition_vector) if one is given (otherwise in index order, with score=None).
+        """
+        letters = phrase_letters(letters)
+        if not letters:
+            return []
+        h = anagram_hash(letters)
+        bucket = h & (len(self.anagram_offsets)-2)  # There's a power-of-2 number of buckets
+        lo, hi = self.anagram_offsets[bucket], self.anagram_offsets[bucket+1]
+        rows = np.asarray(self.anagram_rows[lo:hi])[self.anagram_hashes[lo:hi]==np.uint64(h)]
+
+        start, end, pattern_rows = self.get_pattern_rows(pattern)
+        signature = anagram_signature(letters)
+        rows = np.array([ row for row in rows if start<=row<end 
+                          and anagram_signature(phrase_letters(self.get_phrase(row)))==signature ], dtype=np.int64)
+        if pattern_rows is not None:
+            rows = rows[np.isin(rows, pattern_rows)]
+        if (not definition and definition_vector is None) or len(rows)==0:
+            return [ dict(phrase=self.get_phrase(row), score=None) for row in rows ]
+        if definition_vector is None:
+            definition_vector = self.embedder.embed([definition])[0]
+        scores = self.vectors[rows] @ definition_vector
+        order = np.argsort(-scores, kind='stable')
+        return self.get_matches(rows[order], scores[order])
+
+    def get_matches(self, rows, scores):
+        return [ dict(phrase=self.get_phrase(i), score=score) for i, score in zip(rows, scores) ]
+
+    def substring_matches(self, query, k, substrings, start, end, rows=None):
+        # Only the rows that survive both the enumeration (or rows) and the ngram filters are scored
+        candidates = self.get_candidate_rows(substrings, start, end)
+        if rows is not None:
+            candidates = np.intersect1d(candidates, rows, assume_unique=True)
+        scores = self.vectors[candidates] @ query
+
+        matches = []
+        for i in np.argsort(-scores, kind='stable'):
+            candidate = self.get_phrase(candidates[i])
+            # The ngrams might be present, but not in order (or spread across words : like CrosswordDictionary,
+            #   a substring has to be within one word, so WINDOWL doesn't match 'window ledge')
+            words = phrase_words(candidate)
+            if not all(any(s in word for word in words) for s in substrings):
+                continue
+            matches.append(dict(phrase=candidate, score=scores[i]))
+            if len(matches)>=k:
+                break
+        return matches
+
+
+def ann_recall(phrase_index, queries, k=10, nprobe_values=(1, 4, 16, 32, 64)):
+    """recall@k of the IVF search against the exact search, for each nprobe value
+
+    Returns a list of dicts (one per nprobe), also reporting the fraction of queries 
+    whose top-k (including their order) is unchanged, and the mean latencies.
+    """
+    query_vectors = phrase_index.embedder.embed(queries)
+    t0=time.time()
+    exact = [ phrase_index.top_k_rows(q, k)[0] for q in query_vectors ]
+    exact_ms = (time.time()-t0)*1000./len(queries)
+
+    results = []
+    for nprobe in nprobe_values:
+        t0=time.time()
+        approx = [ phrase_index.top_k_rows(q, k, rows=phrase_index.ivf_candidate_rows(q, nprobe=nprobe))[0] 
+                   for q in query_vectors ]
+        ivf_ms = (time.time()-t0)*1000./len(queries)
+        results.append(dict(
+            nprobe=nprobe,
+            recall=float(np.mean([ len(set(e) & set(a))/len(e) for e, a in zip(exact, approx) ])),
+            unchanged=float(np.mean([ list(e)==list(a) for e, a in zip(exact, approx) ])),
+            exact_ms=exact_ms, ivf_ms=ivf_ms,
+        ))
+    return results
+
+
+# The self-check queries, and the results CrosswordDictionary (the original, exhaustive dictionary tool) gave them
+SELF_CHECK_QUERIES = [
+    # 42-0  = "little bird to dart across sill (10)"
+    #          FLEDGELING (little bird) = "FLING" (to dart) outside (across) "LEDGE" (sill)
+    (dict(definition='sill', k=10),
+     ['SILL', 'STRAINING SILL', 'SILLS', 'REAR WINDOW', 'WINDOW LEDGES', 'WALL PLATE', 
+      'LAMP CHIMNEY', 'WINDOW LEDGE', 'WET PLATE', 'CHIMNEY']),
+    (dict(definition='little bird', k=10, pattern='(10)', substrings=["LEDGE"]),
+     ['FLEDGELING', 'PLEDGEABLE', 'LEDGERLINE', 'LEDGERBAIT']),
+
+    # 42-1  = "rising star, runner (4)" (down clue)
+    #         reversal (rising+down clue) of "NOVA" (star) = "AVON" (a runner / river!) 
+    (dict(definition='star', k=50, pattern='(4)', substrings=[]),
+     ['STAR', 'DIVA', 'IDOL', 'HERO', 'FAME', 'STUD', 'HUNK', 'GIRL', 'RING', 'BEAU', 'MOON', 
+      'CAST', 'TRIO', 'AFRO', 'CLUB', 'SUNS', 'GLAM', 'ICON', 'FANS', 'ACES', 'SHOT', 'SHOW', 
+      'BUFF', 'HALO', 'CHEF', 'FILM', 'LADY', 'TEEN', 'EMMY', 'WEDS', 'WINS', 'LION', 'BABE', 
+      'PROM', 'GOER', 'PAIR', 'BALL', 'SEXY', 'TEAM', 'GALA', 'NOVA', 'CAPE', 'FLOP', 'TOON', 
+      'MUSE', 'PHOT', 'ROCK', 'HITS', 'VAMP', 'FAVE']),
+
+    # 88-0  = "sides from elsewhere overwhelming crack team (6)"
+    #         E+E (sides of ELSEWHERE) with "QUIP" (crack) inside = EQUIPE (team)
+    (dict(definition='team', k=10, pattern='(6)', substrings=["QUIP"]),
+     ['EQUIPS', 'QUIPOS', 'QUIPUS']),  # Oooof ... not quite!
+
+    # 88-1 = "is series of lectures spanning two days treated formally? (10)"
+    #        "IS" + "COURSE" (series of lectures) inside (spanning) D+D (two days) = DISCOURSED (treated formally)
+    (dict(definition='treated formally', k=10, pattern='(10)', substrings=["COURSE"]),
+     ['DISCOURSED', 'RACECOURSE', 'DAMPCOURSE', 'FORECOURSE', 'DISCOURSES', 
+      'CONCOURSES', 'COURSEWORK', 'GOLFCOURSE', 'LOBSCOURSE', 'DISCOURSER']),
+]
+SELF_CHECK_MIN_OVERLAP = 0.95  # The tool fails to load if its self-check results' mean overlap with CrosswordDictionary's is below this
+
+
+def search_parity(dictionary, queries, reference_phrases):
+    """Overlap of dictionary's find_nearest_words results with a reference's (eg: CrosswordDictionary's)
+
+    queries are dicts of definition, k, pattern and substrings, and reference_phrases the phrases
+    the reference returned for each.  Returns a list of dicts (one per query), with the phrases found,
+    the fraction of the reference's phrases among them (overlap), and the phrases missing / extra.
+    """
+    results = []
+    for query, reference in zip(queries, reference_phrases):
+        matches = dictionary.find_nearest_words(query["definition"], k=query.get("k", 10), 
+                                                pattern=query.get("pattern"), substrings=query.get("substrings"))
+        phrases = [ match["phrase"].upper() for match in matches ]
+        reference = [ phrase.upper() for phrase in reference ]
+        results.append(dict(
+            query,
+            phrases=phrases,
+            overlap=len(set(phrases) & set(reference))/max(len(reference), 1),
+            missing=[ phrase for phrase in reference if phrase not in phrases ],
+            extra=[ phrase for phrase in phrases if phrase not in reference ],
+        ))
+    return results
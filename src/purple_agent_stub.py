@@ -0,0 +1,117 @@
+import argparse
+import asyncio
+import re, json
+import uvicorn
+
+import logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("crypticreasoner_solver_stub")
+
+from a2a.server.apps import A2AStarletteApplication
+from a2a.server.request_handlers import DefaultRequestHandler
+from a2a.server.tasks import InMemoryTaskStore
+from a2a.server.agent_execution import AgentExecutor, RequestContext
+from a2a.server.events import EventQueue
+from a2a.types import (
+    AgentCapabilities,
+    AgentCard,
+    UnsupportedOperationError,
+)
+from a2a.utils import new_agent_text_message
+from a2a.utils.errors import ServerError
+
+# A deterministic stand-in for purple_agent_gemini-flash.py (no LLM, no network) : for load-testing the green agent
+#   It answers each clue according to a scripted policy, looking up the answer in the local dataset
+
+POLICIES = [
+    "answer",     # Answer each clue correctly, immediately
+    "search",     # Make --searches dictionary_search calls, then answer correctly
+    "malformed",  # Reply without any parsable JSON (so the green agent uses up its max_turns)
+]
+
+CLUE_RE = re.compile(r'clue: "(.*)"\s*$', re.DOTALL)
+ENUMERATION_RE = re.compile(r'(\([\d,\- ]+\))\s*$')
+
+
+def tool_call(name, **arguments):
+    return f"Thinking about it...\n<json>\n{json.dumps(dict(name=name, arguments=arguments))}\n</json>"
+
+
+class StubSolverExecutor(AgentExecutor):
+    def __init__(self, answers, policy="answer", searches=2, latency=0.):
+        self.answers = answers  # clue -> answer
+        self.policy, self.searches, self.latency = policy, searches, latency
+        self.contexts = dict()  # context_id -> dict(clue, searches) for the clue being solved
+
+    def reply(self, context_id, text):
+        match = CLUE_RE.search(text)
+        if match:  # A new clue (possibly after the preamble)
+            self.contexts[context_id] = dict(clue=match.group(1), searches=0)
+        state = self.contexts.get(context_id)
+        if state is None:
+            return "I haven't been given a clue"
+
+        if self.policy=="malformed":
+            return "<json>{\"name\": \"answer\", \"arguments\": "  # Never closed
+        if self.policy=="search" and state["searches"]<self.searches:
+            words = ENUMERATION_RE.sub('', state["clue"]).split() or ["clue"]
+            enumeration = ENUMERATION_RE.search(state["clue"])
+            definition = words[-1-state["searches"] % len(words)]  # Working backwards through the clue
+            state["searches"] += 1
+            return tool_call("dictionary_search", definition=definition.strip('.,;:!?"\''),
+                             pattern=enumeration.group(1) if enumeration else "")
+        del self.contexts[context_id]
+        return tool_call("answer", answer=self.answers.get(state["clue"], "UNKNOWN"))
+
+    async def execute(self, context: RequestContext, event_queue: EventQueue) -> None:
+        if self.latency>0:
+            await asyncio.sleep(self.latency)
+        response = self.reply(context.context_id, context.get_user_input())
+        await event_queue.enqueue_event(new_agent_text_message(response, context_id=context.context_id))
+
+    async def cancel(self, context: RequestContext, event_queue: EventQueue) -> None:
+        raise ServerError(error=UnsupportedOperationError())
+
+
+def load_answers(dataset, split):
+    import clue_dataset  # Only needed for the answers
+    clues = clue_dataset.load_dataset(dataset, split)
+    return { clues.get(i, 'clue'): clues.get(i, 'answer') for i in range(len(clues)) }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a scripted (offline) CrypticReasoner_solver stub agent.")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Host to bind the server")
+    parser.add_argument("--port", type=int, default=9019, help="Port to bind the server")
+    parser.add_argument("--card-url", type=str, help="External URL to provide in the agent card")
+    parser.add_argument("--policy", type=str, default="answer", choices=POLICIES, help="How each clue is answered")
+    parser.add_argument("--searches", type=int, default=2, help="dictionary_search calls per clue (for --policy search)")
+    parser.add_argument("--latency", type=float, default=0., help="Seconds before each reply (to stand in for a slow LLM)")
+    parser.add_argument("--dataset", type=str, default="cryptonite", help="Dataset to look the answers up in")
+    parser.add_argument("--split", type=str, default="val", help="Split to look the answers up in")
+    args = parser.parse_args()
+
+    answers = load_answers(args.dataset, args.split) if args.policy!="malformed" else dict()
+    logger.info(f"Stub solver : {args.policy=} {args.searches=} {args.latency=} ({len(answers)} answers)")
+
+    agent_card = AgentCard(
+        name="crypticreasoner_solver_stub",
+        description='Answers Cryptic Crossword clues from a script (for load-testing).',
+        url=args.card_url or f'http://{args.host}:{args.port}/',
+        version='1.0.0',
+        default_input_modes=['text'],
+        default_output_modes=['text'],
+        capabilities=AgentCapabilities(streaming=True),
+        skills=[],
+    )
+
+    request_handler = DefaultRequestHandler(
+        agent_executor=StubSolverExecutor(answers, policy=args.policy, searches=args.searches, latency=args.latency),
+        task_store=InMemoryTaskStore(),
+    )
+    server = A2AStarletteApplication(agent_card=agent_card, http_handler=request_handler)
+    uvicorn.run(server.build(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import sys, time
+import argparse
+import json
+import platform
+import subprocess
+
+import numpy as np
+
+import clue_dataset
+from agent import Agent, tidy_up_answer, SEARCH_ACTION_NAME
+from phrase_index import PhraseEmbedder, load_phrase_index, SEARCH_MODES, PRECISIONS
+
+# Micro-benchmarks of the dictionary tool and the response parsing, on (seeded) query sets drawn from Cryptonite clues
+#   The results are written as JSON, so that runs on different commits can be compared (with --compare)
+#   e.g. : uv run src/run-benchmarks.py --output bench-new.json --compare bench-old.json
+
+parser = argparse.ArgumentParser(description="Benchmark the dictionary tool and response parsing.")
+parser.add_argument("--model-file", type=str, default="./src/cc.en.100.bin", help="fastText embeddings model")
+parser.add_argument("--index-dir", type=str, default="./src/ukacd-index", help="Directory containing the phrase index")
+parser.add_argument("--split", type=str, default="val", help="Cryptonite split to draw the queries from")
+parser.add_argument("--seed", type=int, default=42, help="Seed for choosing the clues (keep this fixed to compare runs)")
+parser.add_argument("--num-clues", type=int, default=200, help="Number of clues to draw the queries from")
+parser.add_argument("--k", type=int, default=10, help="Number of nearest words returned by each search")
+parser.add_argument("--search-mode", type=str, default="exact", choices=SEARCH_MODES, help="Dictionary search mode")
+parser.add_argument("--search-precision", type=str, default="float32", choices=PRECISIONS, help="Dictionary vector precision")
+parser.add_argument("--repeats", type=int, default=200, help="Repeats of each parsing benchmark input")
+parser.add_argument("--output", type=str, default="", help="File to write the JSON results to (as well as stdout)")
+parser.add_argument("--compare", type=str, default="", help="Earlier JSON results to compare against")
+args = parser.parse_args()
+
+
+def timings(fn, inputs):
+    """Runs fn on each of the inputs, returning the latency statistics (in milliseconds)"""
+    fn(inputs[0])  # Warm up
+    latencies = []
+    for x in inputs:
+        t0 = time.perf_counter()
+        fn(x)
+        latencies.append((time.perf_counter()-t0)*1000.)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return dict(n=len(latencies), mean_ms=float(np.mean(latencies)),
+                p50_ms=float(p50), p95_ms=float(p95), p99_ms=float(p99))
+
+
+def get_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+## The query sets : definitions are the first and last words of each clue (where the definition usually is),
+#    the pattern is the clue's enumeration, and the substrings are fragments of the answer (as a solver might guess)
+clues = clue_dataset.sample_clues("cryptonite", args.split, args.seed, args.num_clues)
+
+queries = []  # (definition, pattern, substrings)
+for clue in clues:
+    letters = tidy_up_answer(clue['answer'])
+    substrings = [ letters[:2], letters[-3:] ] if len(letters)>=5 else [ letters[:1] ]
+    for definition in clue_dataset.definition_candidates(clue['clue']):
+        queries.append((definition, clue['enumeration'], substrings))
+
+results = dict()
+
+## Load times
+t0 = time.perf_counter()
+embedder = PhraseEmbedder(model_file=args.model_file)
+results["load_model"] = dict(seconds=time.perf_counter()-t0)
+t0 = time.perf_counter()
+phrase_index = load_phrase_index(args.index_dir, embedder)
+results["load_index"] = dict(seconds=time.perf_counter()-t0, phrases=len(phrase_index))
+phrase_index.configure(search_mode=args.search_mode, precision=args.search_precision)
+
+## find_nearest_words, with each combination of constraints
+for name, use_pattern, use_substrings in [
+        ("search_unconstrained", False, False), ("search_pattern", True, False),
+        ("search_substrings", False, True), ("search_pattern_substrings", True, True)]:
+    results[name] = timings(
+        lambda q: phrase_index.find_nearest_words(q[0], k=args.k, pattern=q[1] if use_pattern else None,
+                                                  substrings=q[2] if use_substrings else None),
+        queries)
+
+## parse_json_segment, on long solver replies (reasoning, then a tool call, then some trailing text)
+agent = Agent()
+replies = []
+for i, clue in enumerate(clues):
+    reasoning = "\n".join(f"Step {step}: considering '{clue['clue']}' - perhaps the definition is at one end, "
+                          f"and the wordplay gives the letters of the answer..." for step in range(5+i%40))
+    tool_call = json.dumps(dict(name=SEARCH_ACTION_NAME, arguments=dict(
+        definition=clue['clue'].split()[-2], pattern=clue['enumeration'])), indent=2)
+    if i%2==0:
+        replies.append(f"{reasoning}\n<json>\n{tool_call}\n</json>\nLet me see what comes back.")
+    else:
+        replies.append(f"{reasoning}\n```json\n{tool_call}\n```\n")
+replies = (replies*(args.repeats//len(replies)+1))[:max(args.repeats, len(replies))]
+results["parse_json_segment"] = timings(agent.parse_json_segment, replies)
+results["parse_json_segment"]["mean_reply_chars"] = float(np.mean([ len(r) for r in replies ]))
+
+## tidy_up_answer
+answers = [ clue['answer'] for clue in clues ]
+results["tidy_up_answer"] = timings(tidy_up_answer, (answers*(args.repeats//len(answers)+1))[:max(args.repeats, len(answers))])
+
+report = dict(
+    commit=get_commit(), time=time.strftime("%Y-%m-%dT%H:%M:%S"),
+    python=platform.python_version(), machine=platform.machine(),
+    config=dict(split=args.split, seed=args.seed, num_clues=args.num_clues, num_queries=len(queries), k=args.k,
+                search_mode=args.search_mode, search_precision=args.search_precision),
+    results=results,
+)
+print(json.dumps(report, indent=2))
+if args.output:
+    with open(args.output, 'wt') as f:
+        json.dump(report, f, indent=2)
+
+if args.compare:  # Ratio of each (mean) timing to the earlier run's : >1 is slower
+    with open(args.compare, 'rt') as f:
+        earlier = json.load(f)
+    if earlier.get("config") != report["config"]:
+        print(f"Warning : configs differ ({earlier.get('config')} vs {report['config']})", file=sys.stderr)
+    for name, result in results.items():
+        key = "seconds" if "seconds" in result else "mean_ms"
+        before = earlier.get("results", {}).get(name, {}).get(key)
+        if before:
+            print(f"{name:28s} {key:8s} {before:10.4f} -> {result[key]:10.4f}  x{result[key]/before:.2f}"
+                  f" (vs {earlier.get('commit')})")
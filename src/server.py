@@ -2,6 +2,12 @@ import argparse
 import uvicorn
 
 import textwrap
+import asyncio
+import contextlib
+import logging
+
+from starlette.routing import Route
+from starlette.responses import JSONResponse, PlainTextResponse
 
 from a2a.server.apps import A2AStarletteApplication
 from a2a.server.request_handlers import DefaultRequestHandler
@@ -12,7 +18,34 @@ from a2a.types import (
     AgentSkill,
 )
 
-from executor import Executor
+import agent
+from executor import Executor, DEFAULT_MAX_AGENTS, DEFAULT_AGENT_IDLE_TTL
+from phrase_index import (
+    SEARCH_MODES, DEFAULT_SEARCH_MODE, DEFAULT_ANN_NPROBE, PRECISIONS, DEFAULT_PRECISION, DEFAULT_RERANK_DEPTH,
+)
+from dictionary_search import (
+    SEARCH_POOL_TYPES, DEFAULT_SEARCH_POOL, DEFAULT_SEARCH_WORKERS, DEFAULT_CACHE_SIZE, DEFAULT_CACHE_TTL,
+    DEFAULT_BATCH_SIZE, DEFAULT_BATCH_WAIT,
+)
+from messenger import client_pool
+from checkpoint import CheckpointStore, DEFAULT_CHECKPOINT_FILE
+from transcripts import TranscriptStore, DEFAULT_TRANSCRIPT_DIR
+from status_updates import conversation_logger
+from metrics import render_metrics
+
+
+async def liveness(request):
+    return JSONResponse(dict(status="ok"))
+
+
+async def readiness(request):
+    """503 until the dictionary tool has loaded (or if it failed to)"""
+    status = agent.dictionary_status()
+    return JSONResponse(dict(status=status), status_code=200 if status=="ready" else 503)
+
+
+async def metrics(request):
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 
 def main():
@@ -20,8 +53,43 @@ def main():
     parser.add_argument("--host", type=str, default="127.0.0.1", help="Host to bind the server")
     parser.add_argument("--port", type=int, default=9009, help="Port to bind the server")
     parser.add_argument("--card-url", type=str, help="URL to advertise in the agent card")
+    parser.add_argument("--search-pool", type=str, default=DEFAULT_SEARCH_POOL, choices=SEARCH_POOL_TYPES, 
+                        help="Worker pool type for dictionary_search (process workers map the shared index, and are sent the embedded queries)")
+    parser.add_argument("--search-workers", type=int, default=DEFAULT_SEARCH_WORKERS, help="Number of dictionary_search workers")
+    parser.add_argument("--search-cache-size", type=int, default=DEFAULT_CACHE_SIZE, help="Maximum number of cached dictionary_search results (0 disables)")
+    parser.add_argument("--search-cache-ttl", type=float, default=DEFAULT_CACHE_TTL, help="Seconds before a cached dictionary_search result expires (0 means never)")
+    parser.add_argument("--search-batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Maximum number of dictionary_search queries searched together (1 disables batching)")
+    parser.add_argument("--search-batch-wait", type=float, default=DEFAULT_BATCH_WAIT, help="Seconds a dictionary_search query waits for others to batch with")
+    parser.add_argument("--search-mode", type=str, default=DEFAULT_SEARCH_MODE, choices=SEARCH_MODES, 
+                        help="How unconstrained dictionary_searches are done (exact scan, or approximate IVF)")
+    parser.add_argument("--ann-nprobe", type=int, default=DEFAULT_ANN_NPROBE, help="IVF lists scanned per approximate search (see check-ann-recall.py)")
+    parser.add_argument("--search-precision", type=str, default=DEFAULT_PRECISION, choices=PRECISIONS, 
+                        help="Precision of the dictionary vectors scanned (compact scans are re-ranked in float32)")
+    parser.add_argument("--rerank-depth", type=int, default=DEFAULT_RERANK_DEPTH, help="Candidates re-ranked in float32 after a compact scan")
+    parser.add_argument("--self-check", action="store_true", help="Print (and time) the example dictionary queries run once it has loaded")
+    parser.add_argument("--min-parity", type=float, default=agent.SELF_CHECK_MIN_OVERLAP,
+                        help="Mean overlap with CrosswordDictionary's recorded results the example queries need for the dictionary tool to be ready (0 disables)")
+    parser.add_argument("--ready-timeout", type=float, default=agent.DICTIONARY_READY_TIMEOUT, 
+                        help="Seconds an evaluation waits for the dictionary tool to load before being rejected (0 rejects immediately)")
+    parser.add_argument("--max-agents", type=int, default=DEFAULT_MAX_AGENTS, help="Maximum number of evaluation contexts held at once")
+    parser.add_argument("--agent-idle-ttl", type=float, default=DEFAULT_AGENT_IDLE_TTL, help="Seconds before an idle evaluation context is released")
+    parser.add_argument("--checkpoint-file", type=str, nargs='?', default="", const=DEFAULT_CHECKPOINT_FILE, 
+                        help=f"SQLite file of completed task results, so resubmitted evaluations resume (off unless given; default {DEFAULT_CHECKPOINT_FILE})")
+    parser.add_argument("--transcript-dir", type=str, default=DEFAULT_TRANSCRIPT_DIR, 
+                        help="Directory for solver transcripts, recorded / replayed via the 'transcripts' config key ('' disables)")
+    parser.add_argument("--conversation-log", type=str, default="", 
+                        help="File to append the full text of solver responses and tool results to (status updates are truncated)")
     args = parser.parse_args()
 
+    if args.conversation_log:
+        conversation_handler = logging.FileHandler(args.conversation_log)
+        conversation_handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        conversation_logger.addHandler(conversation_handler)
+        conversation_logger.setLevel(logging.INFO)
+
+    checkpoint_store = CheckpointStore(args.checkpoint_file) if args.checkpoint_file else None
+    transcript_store = TranscriptStore(args.transcript_dir) if args.transcript_dir else None
+
     # Fill in your agent card
     # See: https://a2a-protocol.org/latest/tutorials/python/3-agent-skills-and-card/
     
@@ -62,14 +130,41 @@ def main():
     )
 
     request_handler = DefaultRequestHandler(
-        agent_executor=Executor(),
+        agent_executor=Executor(dictionary_ready_timeout=args.ready_timeout, 
+                                max_agents=args.max_agents, agent_idle_ttl=args.agent_idle_ttl,
+                                checkpoint_store=checkpoint_store, transcript_store=transcript_store),
         task_store=InMemoryTaskStore(),
     )
     server = A2AStarletteApplication(
         agent_card=agent_card,
         http_handler=request_handler,
     )
-    uvicorn.run(server.build(), host=args.host, port=args.port)
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        # The dictionary tool loads in the background : the server (and agent card) are available immediately
+        load_task = asyncio.create_task(agent.load_dictionary_tool(
+            index_config=dict(search_mode=args.search_mode, nprobe=args.ann_nprobe,
+                              precision=args.search_precision, rerank_depth=args.rerank_depth),
+            search_config=dict(pool=args.search_pool, max_workers=args.search_workers, 
+                               cache_size=args.search_cache_size, cache_ttl=args.search_cache_ttl,
+                               batch_size=args.search_batch_size, batch_wait=args.search_batch_wait),
+            self_check=args.self_check, min_parity=args.min_parity,
+        ))
+        yield
+        load_task.cancel()
+        await client_pool.close()  # Shut down the pooled connections to the participant agents
+        if agent.dictionary_search is not None:
+            agent.dictionary_search.shutdown()
+        if checkpoint_store is not None:
+            checkpoint_store.close()
+
+    routes = [
+        Route("/healthz", liveness, methods=["GET"]),
+        Route("/readyz", readiness, methods=["GET"]),
+        Route("/metrics", metrics, methods=["GET"]),
+    ]
+    uvicorn.run(server.build(routes=routes, lifespan=lifespan), host=args.host, port=args.port)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,25 @@
+import argparse
+import time
+
+from phrase_index import PhraseEmbedder, build_phrase_index, load_phrase_index, DEFAULT_ANN_LISTS
+
+# Pre-compute the dictionary's phrase embeddings, so that the server can just memory-map them at startup
+
+parser = argparse.ArgumentParser(description="Build the dictionary_search phrase index.")
+parser.add_argument("--model-file", type=str, default="./src/cc.en.100.bin", help="fastText embeddings model")
+parser.add_argument("--dictionary-file", type=str, default="./src/UKACD.txt", help="Crossword dictionary (one phrase per line)")
+parser.add_argument("--index-dir", type=str, default="./src/ukacd-index", help="Directory to write the index into")
+parser.add_argument("--ann-lists", type=int, default=DEFAULT_ANN_LISTS, help="Number of IVF lists for approximate searches")
+args = parser.parse_args()
+
+t0=time.time()
+embedder = PhraseEmbedder(model_file=args.model_file)
+print(f"Loaded Vector Embedding model in {(time.time()-t0):.2f}sec")
+
+t0=time.time()
+build_phrase_index(embedder, args.dictionary_file, args.index_dir, n_lists=args.ann_lists)
+print(f"Built phrase index in {args.index_dir} in {(time.time()-t0):.2f}sec")
+
+t0=time.time()
+phrase_index = load_phrase_index(args.index_dir, embedder)
+print(f"Loaded phrase index ({len(phrase_index)} phrases) in {(time.time()-t0):.4f}sec")
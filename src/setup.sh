@@ -48,7 +48,15 @@ else
     uv run hf download mdda-rdai/fasttext-cc.en.100.bin cc.en.100.bin.gz --local-dir=. --cache-dir=.
     gunzip cc.en.100.bin.gz
 fi
-# The embeddings will be built when the dictionary is first used
+
+# This pre-computes the dictionary's phrase embeddings (memory-mapped by the server at startup)
+INDEX_DIR="$SCRIPT_DIR/ukacd-index"
+if [ -f "$INDEX_DIR/meta.json" ]; then
+    echo "phrase index already exists at $INDEX_DIR"
+    echo "To rebuild, remove the directory first: rm -rf $INDEX_DIR\n"
+else
+    uv run setup-build-index.py --model-file "$EMBEDDINGS_FILE" --dictionary-file "$DICTIONARY_FILE" --index-dir "$INDEX_DIR"
+fi
 
 
 # This downloads cryptic-crossword utilities (we're interested in solver/corpora.py)
@@ -69,6 +77,8 @@ echo "Dictionary data is at:"
 echo "  $DICTIONARY_FILE"
 echo "Resized embeddings data is at:"
 echo "  $EMBEDDINGS_FILE"
+echo "Dictionary phrase index is at:"
+echo "  $INDEX_DIR"
 echo "cryptic-crossword utilities repo is at:"
 echo "  $CRYPTIC_REPO_DIR"
 
@@ -0,0 +1,101 @@
+import time
+import asyncio
+
+from a2a.types import TaskState
+from a2a.utils import new_agent_text_message
+
+import logging
+logger = logging.getLogger("crypticreasoner_setter")
+
+# The full text of every solver response and tool result goes here (rather than to stdout, or the
+#   A2A event queue) : it only goes anywhere if a handler is added, e.g. by server.py --conversation-log
+conversation_logger = logging.getLogger("crypticreasoner_setter.conversations")
+conversation_logger.propagate = False
+conversation_logger.addHandler(logging.NullHandler())
+
+
+STATUS_MODES = ["full", "summary"]  # Every update (merged and truncated), or just the progress ones
+DEFAULT_STATUS_MODE = "full"
+DEFAULT_STATUS_WINDOW = 0.5  # Seconds over which status updates are merged into one
+DEFAULT_STATUS_MAX_CHARS = 2000  # Longer status updates are truncated
+
+
+def truncate(text, max_chars):
+    if max_chars<=0 or len(text)<=max_chars:
+        return text
+    return text[:max_chars]+f"... [{len(text)-max_chars} more chars]"
+
+
+def merge_updates(texts, max_chars):
+    """texts one per line : if that's longer than max_chars, the earliest are replaced by a count of them
+
+    The latest update is always kept (each is already truncated), so the merged text is at most about max_chars.
+    """
+    text = '\n'.join(texts)
+    if max_chars<=0 or len(text)<=max_chars:
+        return text
+    header = f"[{len(texts)} earlier updates dropped]"  # A little longer than it needs to be, for the budget
+    kept, n_chars = [], len(header)
+    for text in reversed(texts):  # The latest updates are the ones kept
+        if kept and n_chars+len(text)+1>max_chars:
+            break
+        kept.append(text)
+        n_chars += len(text)+1
+    return '\n'.join([f"[{len(texts)-len(kept)} earlier updates dropped]"]+kept[::-1])
+
+
+class StatusCoalescer:
+    """Rate-limits the working-status updates of an evaluation
+
+    Updates arriving within window seconds of the last one sent are merged into the
+    next update (sent once the window has passed).  In "summary" mode, only the
+    progress updates are sent (and only the latest of them, if several are waiting).
+    """
+    def __init__(self, updater, mode=DEFAULT_STATUS_MODE, window=DEFAULT_STATUS_WINDOW,
+                 max_chars=DEFAULT_STATUS_MAX_CHARS):
+        if mode not in STATUS_MODES:
+            raise ValueError(f"mode must be one of {STATUS_MODES}, not {mode!r}")
+        self.updater = updater
+        self.mode, self.window, self.max_chars = mode, window, max_chars
+        self._pending = []
+        self._last_sent = 0.
+        self._flush_task = None
+        self.received, self.sent = 0, 0
+
+    async def update(self, text, progress=False):
+        conversation_logger.info(text)
+        if self.mode=="summary" and not progress:
+            return
+        self.received += 1
+        text = truncate(text, self.max_chars)
+        if self.mode=="summary":
+            self._pending = [text]  # Only the latest progress matters
+        else:
+            self._pending.append(text)
+
+        wait = self._last_sent+self.window-time.monotonic()
+        if wait<=0:
+            await self.flush()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self.flush_later(wait))
+
+    async def flush_later(self, wait):
+        await asyncio.sleep(wait)
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        if not self._pending:
+            return
+        text, self._pending = merge_updates(self._pending, self.max_chars), []
+        self._last_sent = time.monotonic()
+        self.sent += 1
+        await self.updater.update_status(TaskState.working, new_agent_text_message(text))
+
+    async def close(self):
+        """Send anything still waiting (before the evaluation's final result)"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+        logger.info(f"Status updates : {self.received} merged into {self.sent}")
@@ -0,0 +1,78 @@
+import os, re
+import json
+import asyncio
+import threading
+from uuid import uuid4
+
+import logging
+logger = logging.getLogger("crypticreasoner_setter")
+
+
+TRANSCRIPT_MODES = ["off", "record", "replay"]
+DEFAULT_TRANSCRIPT_DIR = "./src/transcripts"
+
+
+class TranscriptStore:
+    """Solver prompt/response pairs, one JSONL file per (participant, dataset, split, seed)"""
+    def __init__(self, transcript_dir: str = DEFAULT_TRANSCRIPT_DIR):
+        self.transcript_dir = transcript_dir
+        self._lock = threading.Lock()
+
+    def get_file(self, participant: str, dataset: str, split: str, seed: int) -> str:
+        participant = re.sub(r'[^A-Za-z0-9.-]+', '_', participant).strip('_')
+        return os.path.join(self.transcript_dir, f"{participant}-{dataset}-{split}-{seed}.jsonl")
+
+    def record(self, key: tuple, task_idx: int, recording: str, turn: int, prompt: str, response: str):
+        line = json.dumps(dict(task_idx=task_idx, recording=recording, turn=turn, prompt=prompt, response=response))
+        with self._lock:
+            os.makedirs(self.transcript_dir, exist_ok=True)
+            with open(self.get_file(*key), 'at') as f:
+                f.write(line+'\n')
+
+    def load(self, key: tuple) -> dict[int, list[str]]:
+        """task_idx -> the solver's responses (in turn order), from the latest recording of each task"""
+        transcript_file = self.get_file(*key)
+        if not os.path.isfile(transcript_file):
+            raise FileNotFoundError(f"No transcript recorded at {transcript_file}")
+        recordings = dict()  # task_idx -> (recording, [responses])
+        with open(transcript_file, 'rt') as f:
+            for line in f:
+                turn = json.loads(line)
+                recording, responses = recordings.get(turn["task_idx"], (None, []))
+                if turn["recording"] != recording:  # A later recording of this task replaces the earlier one
+                    recording, responses = turn["recording"], []
+                responses.append(turn["response"])
+                recordings[turn["task_idx"]] = (recording, responses)
+        return { task_idx: responses for task_idx, (_, responses) in recordings.items() }
+
+
+class RecordingMessenger:
+    """Wraps a Messenger, recording every prompt/response pair of one task"""
+    def __init__(self, messenger, store: TranscriptStore, key: tuple, task_idx: int):
+        self.messenger, self.store, self.key, self.task_idx = messenger, store, key, task_idx
+        self.recording, self.turn = uuid4().hex, 0
+
+    async def talk_to_agent(self, message: str, url: str, **kwargs):
+        response = await self.messenger.talk_to_agent(message, url, **kwargs)
+        # The file is appended to in a thread, like the checkpoint writes (off the event loop)
+        await asyncio.to_thread(self.store.record, self.key, self.task_idx, self.recording, self.turn, message, response)
+        self.turn += 1
+        return response
+
+
+class ReplayMessenger:
+    """Stands in for a Messenger, replaying one task's recorded solver responses (no network)
+
+    Asking for more responses than were recorded raises RuntimeError (the task then gets an 
+    error result, rather than being scored on empty responses).
+    """
+    def __init__(self, responses: list[str]):
+        self.responses = list(responses)
+        self.turn = 0
+
+    async def talk_to_agent(self, message: str, url: str, **kwargs):
+        if self.turn>=len(self.responses):
+            raise RuntimeError(f"Transcript exhausted after {self.turn} turns")
+        response = self.responses[self.turn]
+        self.turn += 1
+        return response
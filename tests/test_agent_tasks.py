@@ -0,0 +1,320 @@
+import asyncio
+import threading
+
+import pytest
+from a2a.utils import new_agent_text_message
+
+import agent
+import clue_dataset
+from agent import Agent, EvalRequest
+
+
+CLUES = [
+    dict(clue="little bird to dart across sill (10)", answer="fledgeling", enumeration="(10)", orientation="across"),
+    dict(clue="rising star, runner (4)", answer="avon", enumeration="(4)", orientation="down"),
+    dict(clue="Initially, babies are naked (4)", answer="bare", enumeration="(4)", orientation="across"),
+    dict(clue="sides from elsewhere overwhelming crack team (6)", answer="equipe", enumeration="(6)", orientation="down"),
+]
+
+
+@pytest.fixture
+def fake_dataset(monkeypatch):
+    """CLUES stands in for every split (recording the threads the dataset is loaded in)"""
+    threads = []
+    def load_dataset(dataset, split):
+        threads.append(threading.current_thread())
+        return CLUES
+    monkeypatch.setattr(clue_dataset, "load_dataset", load_dataset)
+    monkeypatch.setattr(clue_dataset, "get_shuffled_idx", lambda dataset, split, seed: tuple(range(len(CLUES))))
+    return threads
+
+
+def eval_request(**config):
+    return EvalRequest(participants=dict(crypticreasoner_solver="http://127.0.0.1:9019"), config=config)
+
+
+@pytest.mark.asyncio
+async def test_validate_request_loads_the_dataset_off_the_event_loop(fake_dataset):
+    ok, msg = await Agent().validate_request(eval_request(split="val", num_tasks=2))
+    assert ok, msg
+    assert fake_dataset and fake_dataset[0] is not threading.main_thread()
+
+    ok, msg = await Agent().validate_request(eval_request(split="val", num_tasks=len(CLUES)))
+    assert not ok and "num_tasks" in msg
+    ok, msg = await Agent().validate_request(eval_request(split="dev"))
+    assert not ok
+
+
+class FakeUpdater:
+    """Stands in for TaskUpdater, recording the artifacts"""
+    def __init__(self):
+        self.artifacts, self.statuses, self.rejected, self.failed_message = [], [], None, None
+
+    async def update_status(self, state, message=None):
+        self.statuses.append(state)
+
+    async def add_artifact(self, parts, name=None, artifact_id=None):
+        self.artifacts.append((name, [ part.root for part in parts ]))
+
+    async def reject(self, message=None):
+        self.rejected = message
+
+    async def failed(self, message=None):
+        self.failed_message = message
+
+    def result(self):
+        return [ part.data for name, parts in self.artifacts if name=="Result" for part in parts if hasattr(part, "data") ][0]
+
+
+class ScriptedMessenger:
+    """Stands in for Messenger : answers each clue correctly (after a short delay), or raises for FAILING_CLUE
+
+    events records each reset, and whether each prompt started with the preamble.
+    """
+    FAILING_CLUE = "rising star"
+    answers = { clue["clue"]: clue["answer"] for clue in CLUES }
+    started, finished, events = [], [], []
+
+    def __init__(self, streaming=False):
+        self.streaming = streaming
+
+    def reset(self):
+        self.events.append("reset")
+
+    async def talk_to_agent(self, prompt, url, new_conversation=False, on_text=None):
+        clue = next(clue for clue in self.answers if clue in prompt)
+        self.events.append("preamble" if prompt.startswith(agent.task_evaluation_preamble) else "clue")
+        self.started.append(clue)
+        await asyncio.sleep(0.05 if self.FAILING_CLUE not in clue else 0.01)
+        if self.FAILING_CLUE in clue:
+            raise RuntimeError("solver exploded")
+        self.finished.append(clue)
+        return f'<json>{{"name": "answer", "arguments": {{"answer": "{self.answers[clue]}"}}}}</json>'
+
+
+class FakeDictionarySearch:
+    def cache_stats(self):
+        return dict()
+
+    def batch_stats(self):
+        return dict()
+
+
+@pytest.fixture
+def ready_agent(fake_dataset, monkeypatch):
+    monkeypatch.setattr(agent, "Messenger", ScriptedMessenger)
+    monkeypatch.setattr(agent, "dictionary_search", FakeDictionarySearch())
+    monkeypatch.setattr(ScriptedMessenger, "started", [])
+    monkeypatch.setattr(ScriptedMessenger, "finished", [])
+    monkeypatch.setattr(ScriptedMessenger, "events", [])
+    dictionary_ready = asyncio.Event()
+    dictionary_ready.set()
+    monkeypatch.setattr(agent, "dictionary_ready", dictionary_ready)
+    return Agent()
+
+
+async def run_evaluation(evaluator, **config):
+    updater = FakeUpdater()
+    request = eval_request(split="val", status_window=0, **config)
+    await evaluator.run(new_agent_text_message(request.model_dump_json()), updater)
+    return updater
+
+
+@pytest.mark.asyncio
+async def test_a_failing_clue_does_not_cancel_the_others(ready_agent):
+    updater = await run_evaluation(ready_agent, num_tasks=3, max_concurrency=4)
+    summary = updater.result()["summary"]
+    assert summary["num_completed"] == 3 and summary["num_errors"] == 1
+    assert summary["total_score"] == 2
+    assert "error" not in summary
+    assert len(ScriptedMessenger.finished) == 2  # The clues in flight alongside the failure still finished
+
+    failed = [ parts[0].data for name, parts in updater.artifacts if name=="Task result" and "error" in parts[0].data ]
+    assert len(failed) == 1 and "solver exploded" in failed[0]["error"] and failed[0]["score"] == 0
+
+
+@pytest.mark.asyncio
+async def test_final_result_only_has_task_ids_and_scores(ready_agent, monkeypatch):
+    monkeypatch.setattr(ScriptedMessenger, "FAILING_CLUE", "(no clue fails)")
+    updater = await run_evaluation(ready_agent, num_tasks=2)
+    results = updater.result()["results"]
+    assert [ set(result) for result in results ] == [{"num_task", "task_idx", "score"}]*2
+    task_results = [ parts[0].data for name, parts in updater.artifacts if name=="Task result" ]
+    assert all("turn_seconds" in result for result in task_results)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("context, events", [
+    ("shared", ["preamble", "clue", "clue"]),
+    ("fresh", ["preamble", "reset", "preamble", "reset", "preamble"]),
+    ("rolling", ["preamble", "clue", "reset", "preamble"]),  # A new conversation every 2 clues (not a sliding window)
+])
+async def test_context_policies_reset_the_conversation_and_resend_the_preamble(ready_agent, monkeypatch, context, events):
+    monkeypatch.setattr(ScriptedMessenger, "FAILING_CLUE", "(no clue fails)")
+    updater = await run_evaluation(ready_agent, num_tasks=3, max_concurrency=1, context=context, context_window=2)
+    assert updater.result()["summary"]["total_score"] == 3
+    assert ScriptedMessenger.events == events
+
+
+@pytest.mark.asyncio
+async def test_an_evaluation_failure_is_reported(ready_agent):
+    class FailingCheckpointStore:
+        def get_results(self, *key):
+            return dict()
+
+        def put_result(self, *key_and_result):
+            raise OSError("disk full")
+
+    ready_agent.checkpoint_store = FailingCheckpointStore()
+    updater = await run_evaluation(ready_agent, num_tasks=2)
+    assert updater.result()["summary"]["errors"] == ["OSError('disk full')"]
+    assert updater.failed_message is not None
+
+
+@pytest.mark.asyncio
+async def test_resuming_needs_the_same_result_config(ready_agent, monkeypatch, tmp_path):
+    from checkpoint import CheckpointStore
+    monkeypatch.setattr(ScriptedMessenger, "FAILING_CLUE", "(no clue fails)")
+    ready_agent.checkpoint_store = CheckpointStore(str(tmp_path / "checkpoints.sqlite"))
+    try:
+        await run_evaluation(ready_agent, num_tasks=2, context="fresh")
+        updater = await run_evaluation(ready_agent, num_tasks=2, context="shared")
+        assert updater.result()["summary"]["num_resumed"] == 0
+        updater = await run_evaluation(ready_agent, num_tasks=2, context="fresh")
+        assert updater.result()["summary"]["num_resumed"] == 2
+        assert all(result["resumed"] for result in updater.result()["results"])
+    finally:
+        ready_agent.checkpoint_store.close()
+
+
+class EchoDictionarySearch(FakeDictionarySearch):
+    """Each search returns its query as the only match"""
+    async def find_nearest_words(self, definition, k=10, pattern=None, substrings=None):
+        return [dict(phrase=f"{definition}|{pattern}|{','.join(substrings)}", score=1.)]
+
+    async def find_anagrams(self, letters, pattern=None, definition=None):
+        return [dict(phrase=letters[::-1], score=None)]
+
+
+@pytest.mark.asyncio
+async def test_a_list_of_tool_calls_gets_a_result_for_each(monkeypatch):
+    monkeypatch.setattr(agent, "dictionary_search", EchoDictionarySearch())
+    evaluator = Agent()
+    action = [
+        {"name": "dictionary_search", "arguments": {"definition": "naked", "pattern": "(4)", "substrings": "B"}},
+        {"name": "dictionary_search"},
+        {"name": "dictionary_search", "arguments": {"definition": "bird", "substrings": ["L", "E"]}},
+        {"name": "thesaurus", "arguments": {"word": "naked"}},
+        {"name": "anagram_search", "arguments": {"letters": "bear"}},
+        {"name": "anagram_search", "arguments": {"letters": "bear", "definition": 4}},
+        {"name": "dictionary_search", "arguments": {"definition": "bird", "pattern": "(?L?D?E????)"}},
+        {"name": "dictionary_search", "arguments": {"definition": "bird", "pattern": "?L?D?E???? (9)"}},
+        "dictionary_search",
+    ]
+    calls = evaluator.get_tool_calls(action)
+    assert calls == action  # Including the malformed calls, so that the results line up
+    results = await evaluator.run_searches(calls)
+    assert results[0] == {"nearest_matches": ["NAKED|(4)|B"]}
+    assert "arguments" in results[1]["error"]
+    assert results[2] == {"nearest_matches": ["BIRD|NONE|L,E"]}
+    assert "Unknown tool" in results[3]["error"]
+    assert results[4] == {"anagrams": ["RAEB"]}
+    assert "definition" in results[5]["error"]
+    assert results[6] == {"nearest_matches": ["BIRD|(?L?D?E????)|"]}
+    assert "pattern" in results[7]["error"]
+    assert "error" in results[8]
+
+    too_many = [action[0]]*(agent.MAX_SEARCHES_PER_TURN+2)
+    results = await evaluator.run_searches(too_many)
+    assert len(results) == len(too_many) and all("error" in r for r in results[agent.MAX_SEARCHES_PER_TURN:])
+
+    assert evaluator.get_tool_calls(action+[{"name": "answer", "arguments": {"answer": "BARE"}}]) == []
+    assert evaluator.get_tool_calls({"name": "dictionary_search", "arguments": {}}) != []
+    assert evaluator.get_tool_calls({"name": "thesaurus"}) == []
+
+
+@pytest.mark.asyncio
+async def test_prefetched_searches_are_cancelled_if_the_solver_fails(monkeypatch):
+    cancelled = asyncio.Event()
+
+    class BlockingDictionarySearch(FakeDictionarySearch):
+        async def find_nearest_words(self, definition, k=10, pattern=None, substrings=None):
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+    class FailingStreamMessenger:
+        async def talk_to_agent(self, prompt, url, new_conversation=False, on_text=None):
+            on_text('<json>{"name": "dictionary_search", "arguments": {"definition": "sill"}}</json>')
+            await asyncio.sleep(0.01)  # The search is now running
+            raise ConnectionError("stream dropped")
+
+    class NullStatus:
+        async def update(self, text, progress=False):
+            pass
+
+    monkeypatch.setattr(agent, "dictionary_search", BlockingDictionarySearch())
+    with pytest.raises(ConnectionError):
+        await Agent().run_single_task("http://solver", NullStatus(), CLUES[0], messenger=FailingStreamMessenger())
+    assert cancelled.is_set()
+
+
+class RecordedDictionary:
+    """Returns CrosswordDictionary's recorded self-check results (only the first of each, if sparse)"""
+    def __init__(self, sparse=False):
+        self.results = { query["definition"]: phrases[:1] if sparse else phrases for query, phrases in agent.SELF_CHECK_QUERIES }
+
+    def configure(self, **index_config):
+        pass
+
+    def find_nearest_words(self, definition, k=10, pattern=None, substrings=None):
+        return [ dict(phrase=phrase.lower(), score=1.) for phrase in self.results[definition] ]
+
+
+def test_dictionary_self_check_fails_when_results_differ_from_crossword_dictionary(caplog):
+    assert agent.dictionary_self_check(RecordedDictionary(), verbose=False) == 1.
+    assert not [ record for record in caplog.records if record.levelname=="WARNING" ]
+    with pytest.raises(ValueError, match="mean overlap"):
+        agent.dictionary_self_check(RecordedDictionary(sparse=True), verbose=False)
+    warnings = [ record.getMessage() for record in caplog.records if record.levelname=="WARNING" ]
+    assert len(warnings) == len(agent.SELF_CHECK_QUERIES) and "'star'" in warnings[2]
+    assert agent.dictionary_self_check(RecordedDictionary(sparse=True), min_overlap=0., verbose=False) < 0.5
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("sparse, status", [(False, "ready"), (True, "failed")])
+async def test_dictionary_tool_is_only_ready_with_parity(monkeypatch, sparse, status):
+    monkeypatch.setattr(agent, "load_crossword_dictionary", lambda: (None, RecordedDictionary(sparse=sparse)))
+    monkeypatch.setattr(agent, "dictionary_ready", asyncio.Event())
+    monkeypatch.setattr(agent, "dictionary_load_error", None)
+    monkeypatch.setattr(agent, "dictionary_search", None)
+    await agent.load_dictionary_tool()
+    try:
+        assert agent.dictionary_status() == status
+    finally:
+        agent.dictionary_search.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_a_task_with_no_recording_gets_an_error_when_replayed(ready_agent, monkeypatch, tmp_path):
+    from transcripts import TranscriptStore
+    monkeypatch.setattr(ScriptedMessenger, "FAILING_CLUE", "(no clue fails)")
+    ready_agent.transcript_store = TranscriptStore(str(tmp_path))
+    await run_evaluation(ready_agent, num_tasks=2, transcripts="record")
+
+    updater = await run_evaluation(ready_agent, num_tasks=3, transcripts="replay")  # Task 2 was never recorded
+    assert len(ScriptedMessenger.finished) == 2  # Only while recording
+    summary = updater.result()["summary"]
+    assert summary["total_score"] == 2 and summary["num_errors"] == 1
+    assert "No transcript" in updater.result()["results"][2]["error"]
+
+
+@pytest.mark.asyncio
+async def test_an_evaluation_is_rejected_after_the_ready_timeout(ready_agent, monkeypatch):
+    monkeypatch.setattr(agent, "dictionary_ready", asyncio.Event())  # Still loading
+    ready_agent.dictionary_ready_timeout = 0.05
+    updater = await run_evaluation(ready_agent, num_tasks=1)
+    assert updater.rejected is not None and "loading" in str(updater.rejected)
+    assert ScriptedMessenger.started == [] and updater.artifacts == []
@@ -0,0 +1,20 @@
+from checkpoint import CheckpointStore
+
+
+def test_checkpoint_results_are_keyed_by_config(tmp_path):
+    checkpoint_file = str(tmp_path / "checkpoints.sqlite")
+    store = CheckpointStore(checkpoint_file)
+    store.put_result("http://solver", "cryptonite", "val", 42, "shared", 7, dict(score=1, turns=2))
+    store.put_result("http://solver", "cryptonite", "val", 42, "shared", 3, dict(score=0, turns=20))
+    store.put_result("http://solver", "cryptonite", "val", 43, "shared", 7, dict(score=0, turns=5))
+    store.put_result("http://solver", "cryptonite", "val", 42, "fresh", 7, dict(score=0, turns=4))
+    store.close()
+
+    store = CheckpointStore(checkpoint_file)  # Results survive a restart
+    assert store.get_results("http://solver", "cryptonite", "val", 42, "shared") == {
+        7: dict(score=1, turns=2),
+        3: dict(score=0, turns=20),
+    }
+    assert store.get_results("http://solver", "cryptonite", "val", 42, "fresh") == {7: dict(score=0, turns=4)}
+    assert store.get_results("http://other-solver", "cryptonite", "val", 42, "shared") == {}
+    store.close()
@@ -0,0 +1,63 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import clue_dataset
+
+
+CLUES = [
+    dict(clue="little bird to dart across sill (10)", answer="fledgeling", enumeration="(10)", orientation="across"),
+    dict(clue="rising star, runner (4)", answer="avon", enumeration="(4)", orientation="down"),
+]
+
+
+class SlowCrypticDataset:
+    """Stands in for the solver repo's dataset module : parsing a split is slow, and counted"""
+    def __init__(self):
+        self.parses = []
+
+    def load_cryptonite_dataset(self, split, dataset_path=None):
+        self.parses.append(threading.current_thread())
+        time.sleep(0.1)
+        return CLUES
+
+
+@pytest.fixture
+def cryptic_dataset(monkeypatch, tmp_path):
+    cryptic_dataset = SlowCrypticDataset()
+    monkeypatch.setattr(clue_dataset, "get_cryptic_dataset", lambda: cryptic_dataset)
+    monkeypatch.setattr(clue_dataset, "COLUMNS_DIR", str(tmp_path / "dataset-columns"))
+    clue_dataset._load_dataset.cache_clear()
+    yield cryptic_dataset
+    clue_dataset._load_dataset.cache_clear()
+
+
+def test_concurrent_first_loads_parse_the_split_once(cryptic_dataset):
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        datasets = list(pool.map(lambda _: clue_dataset.load_dataset("cryptonite", "val"), range(8)))
+    assert len(cryptic_dataset.parses) == 1
+    assert all(dataset is datasets[0] for dataset in datasets)
+    assert datasets[0][1] == CLUES[1]
+
+
+def test_rewriting_columns_leaves_mapped_files_intact(cryptic_dataset, tmp_path):
+    columns_dir = str(tmp_path / "columns")
+    clue_dataset.write_columns(CLUES, columns_dir)
+    mapped = clue_dataset.read_columns(columns_dir)
+    clue_dataset.write_columns(CLUES[::-1], columns_dir)  # eg: another process rebuilding stale columns
+    assert mapped[0] == CLUES[0]  # The memory-mapped files weren't truncated (or rewritten)
+    assert clue_dataset.read_columns(columns_dir)[0] == CLUES[1]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["columns"]  # No temporary directories left behind
+
+
+def test_definition_candidates():
+    assert clue_dataset.definition_candidates("rising star, runner (4)") == ["rising", "runner"]
+    assert clue_dataset.definition_candidates("Sill? (4,5)") == ["sill"]
+    assert clue_dataset.definition_candidates("(4)") == []
+
+
+def test_sample_clues_follow_the_shuffled_order(cryptic_dataset, monkeypatch):
+    monkeypatch.setattr(clue_dataset, "get_shuffled_idx", lambda dataset, split, seed: (1, 0))
+    assert clue_dataset.sample_clues("cryptonite", "val", 42, 1) == [CLUES[1]]
@@ -0,0 +1,141 @@
+import asyncio
+import functools
+
+import pytest
+
+from dictionary_search import DictionarySearch, LRUCache, normalize_query
+from phrase_index import build_phrase_index, load_phrase_index, load_worker_index, canonical_enumeration
+
+
+class CountingDictionary:
+    """Stands in for CrosswordDictionary, recording the queries that reach it"""
+    def __init__(self):
+        self.queries = []
+
+    def find_nearest_words(self, definition, k=10, pattern=None, substrings=None):
+        self.queries.append((definition, pattern, substrings))
+        return [dict(phrase=definition, score=1.0)]
+
+
+def test_canonical_enumeration():
+    assert canonical_enumeration(None) is None
+    assert canonical_enumeration("") is None
+    assert canonical_enumeration("(10)") == "(10)"
+    assert canonical_enumeration(" 3, 4 ") == "(3,4)"
+    assert canonical_enumeration("(5 - 3)") == "(5-3)"
+
+
+def test_normalize_query():
+    assert normalize_query("  Little   Bird ", "( 10 )", ["ledge", "", " FL "]) == \
+        ("little bird", "(10)", ("FL", "LEDGE"))
+    assert normalize_query("bird", "?l?d?e.???") == ("bird", "?L?D?E????", ())
+
+
+def test_lru_cache_eviction():
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now the least recently used
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.stats() == dict(size=2, max_size=2, ttl=0, hits=1, misses=1, evictions=1)
+
+
+@pytest.mark.asyncio
+async def test_search_cache_hits_normalized_queries():
+    dictionary = CountingDictionary()
+    search = DictionarySearch(dictionary, pool="thread", max_workers=1)
+    try:
+        first = await search.find_nearest_words("Naked", pattern="(4)", substrings=["b", ""])
+        second = await search.find_nearest_words(" naked", pattern="4", substrings=["B"])
+    finally:
+        search.shutdown()
+    assert first == second
+    assert dictionary.queries == [("naked", "(4)", ["B"])]
+    assert search.cache_stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_anagram_cache_shares_letter_multisets():
+    dictionary = CountingDictionary()
+    dictionary.find_anagrams = lambda letters, pattern=None, definition=None: \
+        dictionary.queries.append((letters, pattern, definition)) or [dict(phrase="bare", score=None)]
+    search = DictionarySearch(dictionary, pool="thread", max_workers=1)
+    try:
+        first = await search.find_anagrams("bear", pattern="4")
+        second = await search.find_anagrams("R-A-B-E", pattern="(4)")
+        await search.find_anagrams("bear", pattern="(4)", definition="Naked")
+    finally:
+        search.shutdown()
+    assert first == second
+    assert dictionary.queries == [("ABER", "(4)", None), ("ABER", "(4)", "naked")]
+
+
+class BatchingDictionary(CountingDictionary):
+    """Also records the batches of queries that reach it"""
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def find_nearest_words_batch(self, queries):
+        self.batches.append(len(queries))
+        return [ self.find_nearest_words(*query) for query in queries ]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_searches_are_batched():
+    dictionary = BatchingDictionary()
+    search = DictionarySearch(dictionary, pool="thread", max_workers=1, batch_size=4, batch_wait=0.05)
+    try:
+        results = await asyncio.gather(*[ search.find_nearest_words(f"word{i}") for i in range(6) ])
+    finally:
+        search.shutdown()
+    assert [ r[0]["phrase"] for r in results ] == [ f"word{i}" for i in range(6) ]
+    assert dictionary.batches == [4, 2]  # The first batch is full, the second waits for batch_wait
+    assert search.batch_stats()["histogram"] == {2: 1, 4: 1}
+
+
+@pytest.mark.asyncio
+async def test_search_errors_reach_every_query_in_the_batch():
+    class FailingDictionary:
+        def find_nearest_words(self, definition, k=10, pattern=None, substrings=None):
+            raise RuntimeError("dictionary failed")
+
+    search = DictionarySearch(FailingDictionary(), pool="thread", max_workers=1, batch_size=2)
+    try:
+        results = await asyncio.gather(*[ search.find_nearest_words(f"word{i}") for i in range(2) ],
+                                       return_exceptions=True)
+    finally:
+        search.shutdown()
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_process_pool_workers_are_sent_the_query_vectors(tmp_path):
+    from test_phrase_index import LetterEmbedder, DICTIONARY
+    dictionary_file = tmp_path / "dictionary.txt"
+    dictionary_file.write_text(DICTIONARY)
+    index_dir = str(tmp_path / "index")
+    build_phrase_index(LetterEmbedder(), str(dictionary_file), index_dir, n_lists=2)
+    phrase_index = load_phrase_index(index_dir, LetterEmbedder())
+
+    with pytest.raises(ValueError):
+        DictionarySearch(phrase_index, pool="process", max_workers=1)
+
+    # The workers' index has no embedder, so these searches only work with the vectors embedded here
+    worker_loader = functools.partial(load_worker_index, index_dir)
+    assert worker_loader().embedder is None
+    queries = [("sill", None, None), ("little bird", "(10)", ["ledge"]), ("bird", "?L?D?E????", None)]
+    for batch_size in [1, 16]:
+        search = DictionarySearch(phrase_index, pool="process", max_workers=2, batch_size=batch_size,
+                                  worker_loader=worker_loader)
+        try:
+            results = await asyncio.gather(*[ search.find_nearest_words(definition, pattern=pattern, substrings=substrings)
+                                              for definition, pattern, substrings in queries ])
+            anagrams = await search.find_anagrams("gelding elf", definition="bird")
+        finally:
+            search.shutdown()
+        for (definition, pattern, substrings), matches in zip(queries, results):
+            expected = phrase_index.find_nearest_words(definition, k=10, pattern=pattern, substrings=substrings)
+            assert [ m["phrase"] for m in matches ] == [ m["phrase"] for m in expected ]
+        assert [ m["phrase"] for m in anagrams ] == ["fledgeling"] and anagrams[0]["score"] is not None
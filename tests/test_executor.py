@@ -0,0 +1,80 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+from a2a.types import Message, Part, Role, TextPart, Task
+from a2a.utils.errors import ServerError
+
+import executor
+from executor import Executor
+
+
+class FakeAgent:
+    """Stands in for Agent : run() just returns (so the executor completes the task)"""
+    def __init__(self, **kwargs):
+        pass
+
+    async def run(self, message, updater):
+        pass
+
+
+class RecordingEventQueue:
+    def __init__(self):
+        self.events = []
+
+    async def enqueue_event(self, event):
+        self.events.append(event)
+
+
+def request_context(context_id):
+    message = Message(role=Role.user, parts=[Part(root=TextPart(text="{}"))], message_id=f"message-{context_id}",
+                      context_id=context_id)
+    return SimpleNamespace(message=message, current_task=None)
+
+
+@pytest.fixture
+def fake_agents(monkeypatch):
+    monkeypatch.setattr(executor, "Agent", FakeAgent)
+
+
+def test_idle_agents_are_evicted_by_ttl_then_lru(fake_agents):
+    agents = Executor(max_agents=2, agent_idle_ttl=60)
+    agents.get_agent("a")
+    agents.get_agent("b")
+    agents._last_used["a"] = time.monotonic()-120  # Idle past its TTL
+    agents.get_agent("c")
+    assert list(agents.agents) == ["b", "c"] and agents.counters["evicted_idle"] == 1
+
+    agents._running.add("c")
+    agents.get_agent("d")  # "b" is the least recently used idle agent
+    assert list(agents.agents) == ["c", "d"] and agents.counters["evicted_lru"] == 1
+
+
+def test_running_agents_are_never_evicted(fake_agents):
+    agents = Executor(max_agents=1)
+    agents.get_agent("a")
+    agents._running.add("a")
+    with pytest.raises(ServerError):
+        agents.get_agent("b")
+    assert list(agents.agents) == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_a_request_over_max_agents_is_not_enqueued(fake_agents):
+    agents = Executor(max_agents=1)
+    agents.get_agent("busy")
+    agents._running.add("busy")
+    event_queue = RecordingEventQueue()
+    with pytest.raises(ServerError):
+        await agents.execute(request_context("new"), event_queue)
+    assert event_queue.events == []
+
+
+@pytest.mark.asyncio
+async def test_agents_are_released_when_their_task_ends(fake_agents):
+    agents = Executor(max_agents=1)
+    event_queue = RecordingEventQueue()
+    await agents.execute(request_context("a"), event_queue)
+    assert isinstance(event_queue.events[0], Task)
+    assert event_queue.events[-1].status.state.value == "completed"
+    assert agents.stats() == dict(live=0, running=0, created=1, released=1, evicted_idle=0, evicted_lru=0)
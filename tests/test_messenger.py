@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+from a2a.types import Message, Part, Role, TextPart
+
+import messenger
+from messenger import ClientPool, Messenger, send_message_with_client
+
+
+class StreamingClient:
+    """Stands in for an A2A client, streaming a response as a series of messages"""
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def send_message(self, message):
+        text = ""
+        for chunk in self.chunks:
+            text += chunk
+            yield Message(role=Role.agent, parts=[Part(TextPart(text=text))], message_id="m", context_id="ctx")
+
+
+@pytest.mark.asyncio
+async def test_streamed_response_is_seen_as_it_arrives():
+    seen = []
+    outputs = await send_message_with_client(
+        StreamingClient(["thinking ", "<json>{}</json>", " more"]), "hello", on_text=seen.append)
+    assert seen == ["thinking ", "thinking <json>{}</json>", "thinking <json>{}</json> more"]
+    assert outputs == {"response": "thinking <json>{}</json> more", "context_id": "ctx"}
+
+
+class StubCardResolver:
+    """Stands in for A2ACardResolver, counting the agent card fetches"""
+    fetches = []
+
+    def __init__(self, httpx_client, base_url):
+        self.httpx_client, self.base_url = httpx_client, base_url
+
+    async def get_agent_card(self):
+        self.fetches.append(self.base_url)
+        return dict(url=self.base_url, fetch=len(self.fetches))
+
+
+class FailingClient:
+    """Stands in for the A2A client built from an agent card : sending always fails"""
+    def __init__(self, httpx_client, agent_card, streaming=False, consumer=None):
+        self.httpx_client, self.agent_card, self.streaming = httpx_client, agent_card, streaming
+
+    async def send_message(self, message):
+        raise ConnectionError("agent moved")
+        yield
+
+
+@pytest.fixture
+def stub_a2a(monkeypatch):
+    monkeypatch.setattr(messenger, "A2ACardResolver", StubCardResolver)
+    monkeypatch.setattr(StubCardResolver, "fetches", [])
+    monkeypatch.setattr(messenger, "create_client", FailingClient)
+
+
+@pytest.mark.asyncio
+async def test_client_pool_reuses_the_card_and_client(stub_a2a):
+    pool = ClientPool()
+    client = await pool.get_client("http://solver")
+    assert await pool.get_client("http://solver") is client
+    assert await pool.get_agent_card("http://solver") == dict(url="http://solver", fetch=1)
+    assert await pool.get_client("http://solver", streaming=True) is not client  # A client per streaming mode ...
+    assert (await pool.get_client("http://solver", streaming=True)).httpx_client is client.httpx_client  # ... sharing connections
+    await asyncio.gather(*[ pool.get_client("http://other") for _ in range(5) ])  # Concurrent first calls fetch once
+    assert StubCardResolver.fetches == ["http://solver"]*2 + ["http://other"]
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_client_pool_entries_expire_after_the_ttl(stub_a2a):
+    pool = ClientPool(ttl=0.05)
+    client = await pool.get_client("http://solver")
+    await asyncio.sleep(0.1)
+    assert await pool.get_client("http://solver") is not client
+    assert len(StubCardResolver.fetches) == 2
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_a_failed_request_invalidates_the_cached_card(stub_a2a):
+    pool = ClientPool()
+    solver = Messenger(pool=pool)
+    with pytest.raises(ConnectionError):
+        await solver.talk_to_agent("hello", "http://solver")
+    assert pool._clients == {}  # The agent may have moved : its card is re-resolved next time
+    await pool.get_client("http://solver")
+    assert len(StubCardResolver.fetches) == 2
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_client_pool_close(stub_a2a):
+    pool = ClientPool()
+    client = await pool.get_client("http://solver")
+    await pool.close()
+    assert client.httpx_client.is_closed and pool._clients == {}
+    assert pool.get_httpx_client("http://solver") is not client.httpx_client  # A new connection pool, if used again
+    await pool.close()
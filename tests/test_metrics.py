@@ -0,0 +1,33 @@
+from metrics import Counter, Histogram, render_metrics
+
+
+def test_prometheus_text_format():
+    registry = []
+    histogram = Histogram("test_seconds", "Test durations", labelnames=["phase"], buckets=(0.1, 1.), registry=registry)
+    counter = Counter("test_total", "Test events", labelnames=["result"], registry=registry)
+    histogram.observe(0.05, phase="solver")
+    histogram.observe(0.5, phase="solver")
+    histogram.observe(5., phase="solver")
+    counter.inc(result="hit")
+    counter.inc(2, result="hit")
+
+    assert render_metrics(registry).splitlines() == [
+        '# HELP test_seconds Test durations',
+        '# TYPE test_seconds histogram',
+        'test_seconds_bucket{phase="solver",le="0.1"} 1',
+        'test_seconds_bucket{phase="solver",le="1.0"} 2',
+        'test_seconds_bucket{phase="solver",le="+Inf"} 3',
+        'test_seconds_sum{phase="solver"} 5.55',
+        'test_seconds_count{phase="solver"} 3',
+        '# HELP test_total Test events',
+        '# TYPE test_total counter',
+        'test_total{result="hit"} 3',
+    ]
+
+
+def test_histogram_timer():
+    registry = []
+    histogram = Histogram("test_seconds", "Test durations", registry=registry)
+    with histogram.time():
+        pass
+    assert 'test_seconds_count 1' in render_metrics(registry)
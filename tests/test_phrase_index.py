@@ -0,0 +1,243 @@
+import numpy as np
+import pytest
+
+from phrase_index import (
+    build_phrase_index, load_phrase_index, phrase_enumeration, phrase_letters, build_anagram_index,
+    letter_pattern, canonical_pattern, phrase_words, search_parity,
+)
+
+
+DICTIONARY = """
+sill
+window ledge
+window-ledge
+fledgeling
+pledgeable
+ledgerline
+little bird
+nova
+star
+diva
+o'clock
+"""
+
+
+class LetterEmbedder:
+    """Deterministic stand-in for PhraseEmbedder : a bag of (random) letter vectors"""
+    dim = 16
+    letter_vectors = np.random.default_rng(42).normal(size=(26, 16)).astype(np.float32)
+
+    def embed(self, phrases):
+        vectors = np.zeros((len(phrases), self.dim), dtype=np.float32)
+        for i, phrase in enumerate(phrases):
+            for letter in phrase_letters(phrase):
+                vectors[i] += self.letter_vectors[ord(letter)-ord('A')]
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-8)
+
+
+@pytest.fixture
+def phrase_index(tmp_path):
+    dictionary_file = tmp_path / "dictionary.txt"
+    dictionary_file.write_text(DICTIONARY)
+    embedder = LetterEmbedder()
+    build_phrase_index(embedder, str(dictionary_file), str(tmp_path / "index"))
+    return load_phrase_index(str(tmp_path / "index"), embedder)
+
+
+def test_phrase_enumeration():
+    assert phrase_enumeration("fledgeling") == "(10)"
+    assert phrase_enumeration("window ledge") == "(6,5)"
+    assert phrase_enumeration("window-ledge") == "(6-5)"
+    assert phrase_enumeration("o'clock") == "(6)"
+    assert phrase_enumeration("a & b") == "(1,1)"
+
+
+def test_letter_pattern():
+    assert letter_pattern("?L?D?E????") == ("(10)", "?L?D?E????")
+    assert letter_pattern("w????w l.d?e") == ("(6,5)", "W????WL?D?E")
+    assert letter_pattern("?????? - ?????") == ("(6-5)", "???????????")
+    assert letter_pattern("(10)") is None
+    assert letter_pattern("") is None
+    assert canonical_pattern(" w.??  ,?? ") == "W??? ??"
+    assert canonical_pattern("4, 2") == "(4,2)"
+
+
+def test_letter_patterns_with_parentheses(phrase_index):
+    assert letter_pattern("(?L?D?E????)") == ("(10)", "?L?D?E????")
+    assert letter_pattern("?L?D?E???? (10)") == ("(10)", "?L?D?E????")
+    assert canonical_pattern("(?????? ?e???) (6,5)") == "?????? ?E???"
+    for unparseable in ["?L?D?E???? (9)", "(?L?D?E????10)", "10 letters"]:
+        assert letter_pattern(unparseable) is None and canonical_pattern(unparseable) is None
+    matches = phrase_index.find_nearest_words("bird", k=10, pattern="(?L?D?E????)")
+    assert sorted(match["phrase"] for match in matches) == ["fledgeling", "pledgeable"]
+
+
+def test_index_is_memory_mapped(phrase_index):
+    assert len(phrase_index) == 11
+    assert isinstance(phrase_index.vectors, np.memmap)
+    assert sorted(phrase_index.get_phrase(i) for i in range(len(phrase_index))) == \
+        sorted(DICTIONARY.split('\n')[1:-1])
+
+
+def test_enumeration_buckets(phrase_index):
+    start, end = phrase_index.get_rows("(10)")
+    assert sorted(phrase_index.get_phrase(i) for i in range(start, end)) == \
+        ["fledgeling", "ledgerline", "pledgeable"]
+    assert phrase_index.get_rows("(6-5)") != phrase_index.get_rows("(6,5)")
+    assert phrase_index.get_rows("(99)") == (0, 0)
+    assert phrase_index.find_nearest_words("sill", pattern="(99)") == []
+
+
+def test_find_nearest_words_unconstrained(phrase_index):
+    matches = phrase_index.find_nearest_words("sill", k=3)
+    assert matches[0]["phrase"] == "sill"
+    assert len(matches) == 3
+    assert matches[0]["score"] >= matches[1]["score"] >= matches[2]["score"]
+
+
+def test_find_nearest_words_constrained(phrase_index):
+    matches = phrase_index.find_nearest_words("little bird", k=10, pattern="(10)", substrings=["ledge"])
+    assert sorted(match["phrase"] for match in matches) == ["fledgeling", "ledgerline", "pledgeable"]
+
+    matches = phrase_index.find_nearest_words("sill", k=10, pattern="(6,5)")
+    assert [match["phrase"] for match in matches] == ["window ledge"]
+
+
+@pytest.mark.parametrize("substrings", [["LEDGE"], ["LE"], ["O"], ["LEDG", "ERL"], ["WINDOWL"], ["GEL"], ["ZZZ"]])
+def test_substrings_match_brute_force(phrase_index, substrings):
+    expected = sorted(
+        phrase for phrase in DICTIONARY.split('\n')[1:-1]
+        if all(any(s in word for word in phrase_words(phrase)) for s in substrings)
+    )
+    matches = phrase_index.find_nearest_words("bird", k=100, substrings=substrings)
+    assert sorted(match["phrase"] for match in matches) == expected
+
+    candidates = phrase_index.get_candidate_rows(substrings)
+    assert set(expected) <= set(phrase_index.get_phrase(i) for i in candidates)
+
+
+def test_substrings_do_not_span_words(phrase_index):
+    assert phrase_words("will-o'-the-wisp") == ["WILL", "O", "THE", "WISP"]
+    assert phrase_index.find_nearest_words("sill", k=10, substrings=["WINDOWL"]) == []
+    matches = phrase_index.find_nearest_words("sill", k=10, substrings=["WINDOW", "LEDGE"])
+    assert sorted(match["phrase"] for match in matches) == ["window ledge", "window-ledge"]
+
+
+def test_search_parity(phrase_index):
+    queries = [dict(definition="little bird", k=10, pattern="(10)", substrings=["LEDGE"]), dict(definition="star", k=1)]
+    exact = [ [ match["phrase"] for match in phrase_index.find_nearest_words(q["definition"], k=q["k"], 
+                pattern=q.get("pattern"), substrings=q.get("substrings")) ] for q in queries ]
+    assert [ result["overlap"] for result in search_parity(phrase_index, queries, exact) ] == [1., 1.]
+
+    reference = [["FLEDGELING", "LEDGERBAIT"], []]  # eg: the reference's dictionary has a phrase this one lacks
+    results = search_parity(phrase_index, queries, reference)
+    assert results[0]["overlap"] == 0.5 and results[0]["missing"] == ["LEDGERBAIT"]
+    assert sorted(results[0]["extra"]) == ["LEDGERLINE", "PLEDGEABLE"]
+    assert results[0]["definition"] == "little bird" and results[1]["overlap"] == 0.
+
+
+@pytest.mark.parametrize("pattern", ["?L?D?E????", "P?????????", "??????????", "?????? ?E???", "??????-?????", "S?L?", "Z???"])
+def test_letter_patterns_match_brute_force(phrase_index, pattern):
+    enumeration, letters = letter_pattern(pattern)
+    expected = sorted(
+        phrase for phrase in DICTIONARY.split('\n')[1:-1] if phrase_enumeration(phrase)==enumeration
+        and all(a in '?'+b for a, b in zip(letters, phrase_letters(phrase)))
+    )
+    matches = phrase_index.find_nearest_words("bird", k=100, pattern=pattern)
+    assert sorted(match["phrase"] for match in matches) == expected
+
+    matches = phrase_index.find_nearest_words("bird", k=100, pattern=pattern, substrings=["E"])
+    assert sorted(match["phrase"] for match in matches) == [ p for p in expected if 'E' in phrase_letters(p) ]
+
+
+def test_position_bitsets_span_words(tmp_path):
+    # Enough rows of each length that the bitsets take several 64-bit words
+    rng = np.random.default_rng(0)
+    phrases = sorted(set(''.join(rng.choice(list("abcde"), size=n)) for n in [4]*300+[5]*200), key=len)
+    dictionary_file = tmp_path / "dictionary.txt"
+    dictionary_file.write_text('\n'.join(phrases))
+    build_phrase_index(LetterEmbedder(), str(dictionary_file), str(tmp_path / "index"), n_lists=2)
+    phrase_index = load_phrase_index(str(tmp_path / "index"), LetterEmbedder())
+
+    for pattern in ["A?C?", "??E?", "B????", "?A??E", "DDDDD"]:
+        start, end, rows = phrase_index.get_pattern_rows(pattern)
+        expected = [ i for i in range(start, end) 
+                     if all(a in '?'+b for a, b in zip(pattern.upper(), phrase_letters(phrase_index.get_phrase(i)))) ]
+        assert list(rows) == expected
+
+
+def test_ivf_search(phrase_index):
+    # With every list probed, the approximate search is the exact search
+    exact = phrase_index.find_nearest_words("little bird", k=5)
+    phrase_index.configure(search_mode="ivf", nprobe=len(phrase_index.ivf_centroids))
+    assert phrase_index.find_nearest_words("little bird", k=5) == exact
+    query = phrase_index.embedder.embed(["little bird"])[0]
+    assert sorted(phrase_index.ivf_candidate_rows(query)) == list(range(len(phrase_index)))
+    with pytest.raises(ValueError):
+        phrase_index.configure(search_mode="hnsw")
+
+
+@pytest.mark.parametrize("precision", ["float16", "int8"])
+def test_compact_precision_top_10_unchanged(tmp_path, precision):
+    rng = np.random.default_rng(0)
+    words = set("".join(rng.choice(list("abcdefghijklmnopqrstuvwxyz"), size=rng.integers(3, 12))) for _ in range(3000))
+    dictionary_file = tmp_path / "dictionary.txt"
+    dictionary_file.write_text("\n".join(sorted(words)))
+    embedder = LetterEmbedder()
+    build_phrase_index(embedder, str(dictionary_file), str(tmp_path / "index"), n_lists=16)
+    phrase_index = load_phrase_index(str(tmp_path / "index"), embedder)
+
+    queries = ["bird", "little bird", "sill", "star", "treated formally", "team"]
+    exact = [ phrase_index.find_nearest_words(q, k=10) for q in queries ]
+    exact_pattern = [ phrase_index.find_nearest_words(q, k=10, pattern="(7)") for q in queries ]
+    phrase_index.configure(precision=precision, rerank_depth=50)
+    assert [ phrase_index.find_nearest_words(q, k=10) for q in queries ] == exact
+    assert [ phrase_index.find_nearest_words(q, k=10, pattern="(7)") for q in queries ] == exact_pattern
+
+
+@pytest.mark.parametrize("precision", ["float32", "int8"])
+def test_batch_matches_single_searches(phrase_index, precision):
+    phrase_index.configure(precision=precision)
+    queries = [
+        ("little bird", 5, None, None),
+        ("shelf", 3, "(6,5)", None),
+        ("small bird", 4, "(10)", None),
+        ("window", 3, None, ["ledge"]),
+        ("anything", 3, "(99)", None),  # No phrases of this length
+        ("young bird", 2, "10", None),  # Shares the (10) scan
+    ]
+    batch = phrase_index.find_nearest_words_batch(queries)
+    assert len(batch) == len(queries)
+    for (phrase, k, pattern, substrings), matches in zip(queries, batch):
+        single = phrase_index.find_nearest_words(phrase, k=k, pattern=pattern, substrings=substrings)
+        assert [ m["phrase"] for m in matches ] == [ m["phrase"] for m in single ]
+        assert np.allclose([ m["score"] for m in matches ], [ m["score"] for m in single ], atol=1e-5)
+    assert phrase_index.find_nearest_words_batch([]) == []
+
+
+def test_find_anagrams(tmp_path):
+    dictionary_file = tmp_path / "dictionary.txt"
+    dictionary_file.write_text("listen\nsilent\nenlist\nlist\ntinsel\nlist-en\nstar\nrats\ntsar\n")
+    build_phrase_index(LetterEmbedder(), str(dictionary_file), str(tmp_path / "index"), n_lists=2)
+    phrase_index = load_phrase_index(str(tmp_path / "index"), LetterEmbedder())
+
+    assert sorted(m["phrase"] for m in phrase_index.find_anagrams("Nil set")) == \
+        ["enlist", "list-en", "listen", "silent", "tinsel"]
+    assert sorted(m["phrase"] for m in phrase_index.find_anagrams("nilset", pattern="(6)")) == \
+        ["enlist", "listen", "silent", "tinsel"]
+    assert [ m["phrase"] for m in phrase_index.find_anagrams("nilset", pattern="(4-2)") ] == ["list-en"]
+    assert sorted(m["phrase"] for m in phrase_index.find_anagrams("nilset", pattern="?I????")) == \
+        ["listen", "silent", "tinsel"]
+    assert [ m["phrase"] for m in phrase_index.find_anagrams("nilset", pattern="????-?N") ] == ["list-en"]
+    assert phrase_index.find_anagrams("nilset", pattern="(7)") == []
+    assert phrase_index.find_anagrams("xyz") == []
+    ranked = phrase_index.find_anagrams("arts", definition="star")
+    assert sorted(m["phrase"] for m in ranked) == ["rats", "star", "tsar"]
+    assert all(m["score"] is not None for m in ranked)
+
+
+def test_anagram_index_buckets():
+    offsets, rows, hashes = build_anagram_index(["abc", "cab", "xyz"])
+    assert len(offsets)-1 == 4  # A power of 2, at least one bucket per phrase
+    assert sorted(rows) == [0, 1, 2]
+    assert hashes[list(rows).index(0)] == hashes[list(rows).index(1)]
@@ -0,0 +1,24 @@
+import json
+
+from purple_agent_stub import StubSolverExecutor
+
+
+def parse(response):
+    return json.loads(response.split("<json>")[1].split("</json>")[0])
+
+
+def test_search_policy_then_answer():
+    stub = StubSolverExecutor({"little bird to dart across sill (10)": "fledgeling"}, policy="search", searches=2)
+    first = parse(stub.reply("ctx", 'preamble...\nCryptic Crossword across clue: "little bird to dart across sill (10)"'))
+    assert first == dict(name="dictionary_search", arguments=dict(definition="sill", pattern="(10)"))
+    second = parse(stub.reply("ctx", '<json>{"nearest_matches": []}</json>'))
+    assert second["arguments"]["definition"] == "across"
+    assert parse(stub.reply("ctx", "...")) == dict(name="answer", arguments=dict(answer="fledgeling"))
+
+
+def test_answer_and_malformed_policies():
+    stub = StubSolverExecutor({}, policy="answer")
+    assert parse(stub.reply("ctx", 'Cryptic Crossword clue: "unknown (4)"')) == dict(name="answer", arguments=dict(answer="UNKNOWN"))
+    stub = StubSolverExecutor({}, policy="malformed")
+    response = stub.reply("ctx", 'Cryptic Crossword clue: "unknown (4)"')
+    assert "</json>" not in response
@@ -0,0 +1,41 @@
+import json
+import asyncio
+
+import pytest
+
+import agent
+import server
+
+
+@pytest.fixture
+def dictionary_loading(monkeypatch):
+    """The dictionary tool's state, as it is while loading"""
+    monkeypatch.setattr(agent, "dictionary_ready", asyncio.Event())
+    monkeypatch.setattr(agent, "dictionary_load_error", None)
+
+
+async def readyz():
+    response = await server.readiness(None)
+    return response.status_code, json.loads(response.body)["status"]
+
+
+@pytest.mark.asyncio
+async def test_readyz_is_503_until_the_dictionary_is_ready(dictionary_loading):
+    assert (await server.liveness(None)).status_code == 200
+    assert await readyz() == (503, "loading")
+    agent.dictionary_ready.set()
+    assert await readyz() == (200, "ready")
+
+
+@pytest.mark.asyncio
+async def test_readyz_is_503_if_the_dictionary_failed_to_load(dictionary_loading, monkeypatch):
+    monkeypatch.setattr(agent, "dictionary_load_error", FileNotFoundError("No phrase index"))
+    assert await readyz() == (503, "failed")
+    assert await agent.wait_for_dictionary(timeout=10) is False  # Without waiting for the timeout
+
+
+@pytest.mark.asyncio
+async def test_wait_for_dictionary(dictionary_loading):
+    assert await agent.wait_for_dictionary(timeout=0.05) is False  # Still loading
+    asyncio.get_running_loop().call_later(0.05, agent.dictionary_ready.set)
+    assert await agent.wait_for_dictionary(timeout=10) is True
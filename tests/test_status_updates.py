@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+from a2a.utils import get_message_text
+
+from status_updates import StatusCoalescer, truncate, merge_updates
+
+
+class RecordingUpdater:
+    """Stands in for a TaskUpdater, recording the status texts sent"""
+    def __init__(self):
+        self.texts = []
+
+    async def update_status(self, state, message):
+        self.texts.append(get_message_text(message))
+
+
+def test_truncate():
+    assert truncate("abcdef", 10) == "abcdef"
+    assert truncate("abcdef", 3) == "abc... [3 more chars]"
+    assert truncate("abcdef", 0) == "abcdef"
+
+
+def test_merged_updates_are_capped():
+    assert merge_updates(["a", "b"], 10) == "a\nb"
+    texts = [ f"clue {i} : "+"x"*20 for i in range(50) ]  # eg: 50 concurrent clues reporting in one window
+    merged = merge_updates(texts, 100)
+    assert len(merged) <= 100
+    assert merged.startswith("[48 earlier updates dropped]") and merged.endswith(texts[-1])
+    assert merge_updates(["x"*30, "y"*30], 10) == "[1 earlier updates dropped]\n"+"y"*30  # The latest is always kept
+
+
+@pytest.mark.asyncio
+async def test_updates_within_the_window_are_merged():
+    updater = RecordingUpdater()
+    status = StatusCoalescer(updater, window=0.05, max_chars=5)
+    await status.update("first")  # Sent straight away
+    await status.update("second")
+    await status.update("third")
+    assert updater.texts == ["first"]
+    await asyncio.sleep(0.1)
+    assert updater.texts == ["first", "[1 earlier updates dropped]\nthird"]  # The merged text is capped too
+    await status.close()
+    assert (status.received, status.sent) == (3, 2)
+
+
+@pytest.mark.asyncio
+async def test_summary_mode_sends_only_the_latest_progress():
+    updater = RecordingUpdater()
+    status = StatusCoalescer(updater, mode="summary", window=10)
+    await status.update("1/3 done", progress=True)
+    await status.update("a long solver response")
+    await status.update("2/3 done", progress=True)
+    await status.update("3/3 done", progress=True)
+    await status.close()
+    assert updater.texts == ["1/3 done", "3/3 done"]
@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+from transcripts import TranscriptStore, RecordingMessenger, ReplayMessenger
+
+
+class EchoMessenger:
+    async def talk_to_agent(self, message, url, **kwargs):
+        return f"reply to {message}"
+
+
+def test_latest_recording_is_replayed(tmp_path):
+    store = TranscriptStore(str(tmp_path))
+    key = ("http://solver:9009/", "cryptonite", "val", 42)
+
+    async def record(task_idx, messages):
+        messenger = RecordingMessenger(EchoMessenger(), store, key, task_idx)
+        for message in messages:
+            await messenger.talk_to_agent(message, "http://solver:9009/")
+
+    asyncio.run(record(7, ["a", "b"]))
+    asyncio.run(record(3, ["c"]))
+    asyncio.run(record(7, ["d"]))  # Re-recorded : replaces the first recording of task 7
+
+    recorded = store.load(key)
+    assert recorded == {7: ["reply to d"], 3: ["reply to c"]}
+
+    async def replay():
+        messenger = ReplayMessenger(recorded[3])
+        assert await messenger.talk_to_agent("anything", "") == "reply to c"
+        with pytest.raises(RuntimeError):  # Exhausted transcripts don't return (empty) responses
+            await messenger.talk_to_agent("anything", "")
+
+    asyncio.run(replay())
+
+
+def test_missing_transcript(tmp_path):
+    store = TranscriptStore(str(tmp_path))
+    with pytest.raises(FileNotFoundError):
+        store.load(("http://solver", "cryptonite", "val", 42))